@@ -1,491 +1,2222 @@
-import pygame
-import random
-import sys
-import math
-from enum import Enum
-import time
-
-pygame.init()
-
-# Constants
-SCREEN_WIDTH = 1024
-SCREEN_HEIGHT = 768
-GRID_SIZE = 12
-ROOM_SIZE = 64
-FPS = 60
-SANITY_DRAIN_RATE = 0.05
-ENTITY_SPAWN_CHANCE = 0.015
-SANITY_THRESHOLD_MED = 50
-SANITY_THRESHOLD_LOW = 25
-FLASHLIGHT_BATTERY_MAX = 100
-FLASHLIGHT_DRAIN_RATE = 0.2
-FLASHLIGHT_RECHARGE_RATE = 0.5
-
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-GRAY = (80, 80, 80)
-DARK_GRAY = (40, 40, 40)
-RED = (200, 0, 0)
-DARK_RED = (100, 0, 0)
-BLUE = (0, 120, 255)
-YELLOW = (255, 255, 0)
-
-# Directions
-DIRECTIONS = {
-    'north': (0, -1),
-    'south': (0, 1),
-    'east': (1, 0),
-    'west': (-1, 0)
-}
-REVERSE_DIRECTIONS = {'north': 'south', 'south': 'north', 'east': 'west', 'west': 'east'}
-
-class GameState(Enum):
-    PLAYING = 0
-    PAUSED = 1
-    GAME_OVER = 2
-    VICTORY = 3
-
-class AudioManager:
-    def __init__(self):
-        self.ambient_sounds = {
-            'normal': pygame.mixer.Sound('ambient_normal.wav'),
-            'low_sanity': pygame.mixer.Sound('ambient_low_sanity.wav'),
-            'entity_near': pygame.mixer.Sound('entity_near.wav')
-        }
-        self.event_sounds = {
-            'door_shift': pygame.mixer.Sound('door_shift.wav'),
-            'item_pickup': pygame.mixer.Sound('item_pickup.wav'),
-            'entity_spawn': pygame.mixer.Sound('entity_spawn.wav'),
-            'flashlight_toggle': pygame.mixer.Sound('flashlight_toggle.wav')
-        }
-        self.current_ambient = self.ambient_sounds['normal']
-        self.current_ambient.play(-1)
-
-    def update_ambient(self, player_sanity, entities_near):
-        if player_sanity < SANITY_THRESHOLD_LOW or entities_near:
-            if self.current_ambient != self.ambient_sounds['entity_near']:
-                self.current_ambient.stop()
-                self.current_ambient = self.ambient_sounds['entity_near']
-                self.current_ambient.play(-1)
-        elif player_sanity < SANITY_THRESHOLD_MED:
-            if self.current_ambient != self.ambient_sounds['low_sanity']:
-                self.current_ambient.stop()
-                self.current_ambient = self.ambient_sounds['low_sanity']
-                self.current_ambient.play(-1)
-        else:
-            if self.current_ambient != self.ambient_sounds['normal']:
-                self.current_ambient.stop()
-                self.current_ambient = self.ambient_sounds['normal']
-                self.current_ambient.play(-1)
-
-    def play_event(self, event_name):
-        self.event_sounds[event_name].play()
-
-class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Echoes of the Forgotten")
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
-        self.state = GameState.PLAYING
-        self.player = Player()
-        self.house = House(GRID_SIZE)
-        self.story = StoryManager(self.house, self.player)
-        self.audio = AudioManager()
-        self.message = ""
-        self.message_timer = 0
-        self.distortion_alpha = 0
-        self.entities_near = False
-        self.minimap_surface = pygame.Surface((200, 200), pygame.SRCALPHA)
-
-    def run(self):
-        while self.state != GameState.GAME_OVER and self.state != GameState.VICTORY:
-            self.handle_events()
-            if self.state == GameState.PLAYING:
-                self.update()
-            self.draw()
-            self.clock.tick(FPS)
-        pygame.quit()
-        sys.exit()
-
-    def handle_events(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.state = GameState.GAME_OVER
-            elif event.type == pygame.KEYDOWN:
-                if self.state == GameState.PLAYING:
-                    if event.key == pygame.K_UP:
-                        self.player.move('north')
-                    elif event.key == pygame.K_DOWN:
-                        self.player.move('south')
-                    elif event.key == pygame.K_LEFT:
-                        self.player.move('west')
-                    elif event.key == pygame.K_RIGHT:
-                        self.player.move('east')
-                    elif event.key == pygame.K_SPACE:
-                        self.player.interact()
-                    elif event.key == pygame.K_f:
-                        self.player.toggle_flashlight()
-                    elif event.key == pygame.K_h:
-                        self.player.toggle_hiding()
-                if event.key == pygame.K_p:
-                    self.state = GameState.PAUSED if self.state == GameState.PLAYING else GameState.PLAYING
-
-    def update(self):
-        self.player.update()
-        self.house.update()
-        self.story.update()
-        self.entities_near = any(room.entities for row in self.house.grid for room in row 
-                                if abs(room.x - self.player.x) <= 2 and abs(room.y - self.player.y) <= 2)
-        self.audio.update_ambient(self.player.sanity, self.entities_near)
-        
-        if self.player.sanity <= 0:
-            self.message = "The shadows have claimed your mind. You are lost forever."
-            self.state = GameState.GAME_OVER
-        elif self.story.all_spirits_helped():
-            self.message = "All spirits are at peace. The house releases its grip. You escape."
-            self.state = GameState.VICTORY
-
-        if self.message:
-            self.message_timer += 1
-            if self.message_timer > 180:
-                self.message = ""
-                self.message_timer = 0
-
-        self.distortion_alpha = max(0, 255 - int(self.player.sanity * 2.55))
-        if self.player.sanity < SANITY_THRESHOLD_LOW:
-            self.distortion_alpha = min(255, self.distortion_alpha + random.randint(-20, 20))
-
-    def draw(self):
-        self.screen.fill(BLACK)
-        current_room = self.house.get_room(self.player.x, self.player.y)
-
-        # Draw room
-        room_surface = pygame.Surface((SCREEN_WIDTH - 300, SCREEN_HEIGHT - 100), pygame.SRCALPHA)
-        room_surface.fill((20, 20, 20))
-        pygame.draw.rect(room_surface, GRAY, (50, 50, SCREEN_WIDTH - 400, SCREEN_HEIGHT - 200), 5)
-
-        # Draw doors with dynamic lighting
-        for dir_name, open_door in current_room.doors.items():
-            if open_door:
-                dx, dy = DIRECTIONS[dir_name]
-                door_x = (SCREEN_WIDTH - 300) // 2 + dx * 150
-                door_y = (SCREEN_HEIGHT - 100) // 2 + dy * 150
-                door_color = YELLOW if self.player.flashlight_on else GRAY
-                pygame.draw.rect(room_surface, door_color, (door_x - 25, door_y - 25, 50, 50))
-
-        # Draw items
-        for item in current_room.items:
-            item_x = random.randint(100, SCREEN_WIDTH - 400)
-            item_y = random.randint(100, SCREEN_HEIGHT - 200)
-            pygame.draw.circle(room_surface, BLUE, (item_x, item_y), 10)
-
-        # Draw entities
-        for entity in current_room.entities:
-            entity_x = random.randint(100, SCREEN_WIDTH - 400)
-            entity_y = random.randint(100, SCREEN_HEIGHT - 200)
-            pygame.draw.circle(room_surface, RED, (entity_x, entity_y), 15)
-            if self.player.flashlight_on:
-                pygame.draw.circle(room_surface, (255, 255, 255, 100), (entity_x, entity_y), 20, 2)
-
-        self.screen.blit(room_surface, (50, 50))
-
-        # Draw minimap
-        self.minimap_surface.fill((0, 0, 0, 0))
-        for x in range(max(0, self.player.x - 2), min(GRID_SIZE, self.player.x + 3)):
-            for y in range(max(0, self.player.y - 2), min(GRID_SIZE, self.player.y + 3)):
-                room = self.house.get_room(x, y)
-                map_x = (x - (self.player.x - 2)) * 40 + 10
-                map_y = (y - (self.player.y - 2)) * 40 + 10
-                color = GRAY if self.house.stabilized_regions[room.region] else DARK_GRAY
-                pygame.draw.rect(self.minimap_surface, color, (map_x, map_y, 35, 35))
-                for dir_name, open_door in room.doors.items():
-                    if open_door:
-                        dx, dy = DIRECTIONS[dir_name]
-                        door_x = map_x + 17 + dx * 17
-                        door_y = map_y + 17 + dy * 17
-                        pygame.draw.rect(self.minimap_surface, WHITE, (door_x - 5, door_y - 5, 10, 10))
-        pygame.draw.rect(self.minimap_surface, RED, (90, 90, 35, 35), 2)
-        self.screen.blit(self.minimap_surface, (SCREEN_WIDTH - 250, 50))
-
-        # Draw HUD
-        sanity_text = self.font.render(f"Sanity: {int(self.player.sanity)}", True, WHITE)
-        self.screen.blit(sanity_text, (50, SCREEN_HEIGHT - 80))
-        battery_text = self.font.render(f"Battery: {int(self.player.flashlight_battery)}%", True, WHITE)
-        self.screen.blit(battery_text, (250, SCREEN_HEIGHT - 80))
-        inventory_text = self.small_font.render("Inventory: " + ", ".join([item.name for item in self.player.inventory]), True, WHITE)
-        self.screen.blit(inventory_text, (50, SCREEN_HEIGHT - 50))
-
-        # Draw distortion effects
-        if self.player.sanity < SANITY_THRESHOLD_MED:
-            distortion_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            distortion_surface.fill((100, 0, 0, self.distortion_alpha))
-            self.screen.blit(distortion_surface, (0, 0))
-
-        # Draw messages and state
-        if self.message:
-            msg_surface = pygame.Surface((SCREEN_WIDTH - 100, 100), pygame.SRCALPHA)
-            msg_surface.fill((0, 0, 0, 200))
-            msg_render = self.font.render(self.message, True, DARK_RED)
-            msg_surface.blit(msg_render, (10, 10))
-            self.screen.blit(msg_surface, (50, SCREEN_HEIGHT // 2 - 50))
-        if self.state == GameState.PAUSED:
-            pause_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            pause_surface.fill((0, 0, 0, 150))
-            pause_text = self.font.render("PAUSED - Press P to resume", True, WHITE)
-            pause_surface.blit(pause_text, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2))
-            self.screen.blit(pause_surface, (0, 0))
-
-        pygame.display.flip()
-
-class Player:
-    def __init__(self):
-        self.x = random.randint(0, GRID_SIZE - 1)
-        self.y = random.randint(0, GRID_SIZE - 1)
-        self.sanity = 100
-        self.inventory = []
-        self.hiding = False
-        self.flashlight_on = False
-        self.flashlight_battery = FLASHLIGHT_BATTERY_MAX
-        self.last_battery_recharge = time.time()
-
-    def move(self, direction):
-        if self.hiding:
-            game.message = "You cannot move while hiding."
-            return
-        dx, dy = DIRECTIONS[direction]
-        new_x, new_y = self.x + dx, self.y + dy
-        current_room = game.house.get_room(self.x, self.y)
-        if current_room.doors[direction]:
-            if 0 <= new_x < GRID_SIZE and 0 <= new_y < GRID_SIZE:
-                self.x, self.y = new_x, new_y
-                game.message = f"You move {direction} into {game.house.get_room(self.x, self.y).description}."
-                if game.house.get_room(self.x, self.y).entities and not self.flashlight_on:
-                    game.message += " A shadow watches you!"
-            else:
-                game.message = "An unseen force blocks your path."
-        else:
-            game.message = "The passage is sealed."
-
-    def interact(self):
-        current_room = game.house.get_room(self.x, self.y)
-        if self.hiding:
-            self.hiding = False
-            game.message = "You emerge from hiding."
-            return
-        if current_room.items:
-            item = current_room.items.pop(0)
-            self.inventory.append(item)
-            game.message = f"You picked up {item.name}."
-            game.audio.play_event('item_pickup')
-        elif current_room.entities and not self.hiding:
-            self.hiding = True
-            game.message = "You hide in the shadows, holding your breath."
-        elif not current_room.items and not current_room.entities:
-            game.message = "There's nothing to interact with here."
-
-    def toggle_flashlight(self):
-        if self.hiding:
-            game.message = "You cannot use the flashlight while hiding."
-            return
-        if self.flashlight_battery <= 0:
-            game.message = "Your flashlight battery is drained."
-            return
-        self.flashlight_on = not self.flashlight_on
-        game.message = f"Flashlight {'on' if self.flashlight_on else 'off'}."
-        game.audio.play_event('flashlight_toggle')
-
-    def toggle_hiding(self):
-        if not self.hiding and game.house.get_room(self.x, self.y).entities:
-            self.hiding = True
-            game.message = "You hide from the lurking shadow."
-        elif self.hiding:
-            self.hiding = False
-            game.message = "You stop hiding."
-
-    def update(self):
-        if not self.hiding:
-            self.sanity -= SANITY_DRAIN_RATE
-            current_room = game.house.get_room(self.x, self.y)
-            if current_room.entities:
-                if self.flashlight_on:
-                    current_room.entities = []
-                    game.message = "The flashlight repels the shadow!"
-                else:
-                    self.sanity -= 1.5
-            if self.flashlight_on:
-                self.flashlight_battery -= FLASHLIGHT_DRAIN_RATE
-                if self.flashlight_battery <= 0:
-                    self.flashlight_on = False
-                    game.message = "Your flashlight battery has died."
-        else:
-            self.sanity -= 0.8
-
-        if time.time() - self.last_battery_recharge > 1:
-            self.flashlight_battery = min(FLASHLIGHT_BATTERY_MAX, self.flashlight_battery + FLASHLIGHT_RECHARGE_RATE)
-            self.last_battery_recharge = time.time()
-
-class Room:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.doors = {'north': False, 'south': False, 'east': False, 'west': False}
-        self.items = []
-        self.entities = []
-        self.description = self.generate_description()
-        self.region = self.assign_region()
-        self.clue = None
-
-    def generate_description(self):
-        descriptions = [
-            "A forsaken bedroom, its furniture draped in shadows.",
-            "A narrow hallway, echoing with distant whispers.",
-            "A desolate study, books scattered like forgotten memories.",
-            "A dining room, where the table is set for no one.",
-            "A shadowy attic, filled with cobwebs and secrets.",
-            "A cold basement, the air thick with dampness."
-        ]
-        return random.choice(descriptions)
-
-    def assign_region(self):
-        if self.x < GRID_SIZE // 3 and self.y < GRID_SIZE // 2:
-            return 0
-        elif self.x >= GRID_SIZE // 3 and self.x < 2 * GRID_SIZE // 3 and self.y < GRID_SIZE // 2:
-            return 1
-        elif self.x >= 2 * GRID_SIZE // 3 and self.y < GRID_SIZE // 2:
-            return 2
-        elif self.x < GRID_SIZE // 2 and self.y >= GRID_SIZE // 2:
-            return 3
-        else:
-            return 4
-
-class House:
-    def __init__(self, size):
-        self.size = size
-        self.grid = [[Room(x, y) for y in range(size)] for x in range(size)]
-        self.spanning_tree = self.generate_spanning_tree()
-        self.set_doors()
-        self.stabilized_regions = [False] * 5
-        self.last_shift = time.time()
-
-    def generate_spanning_tree(self):
-        visited = [[False for _ in range(self.size)] for _ in range(self.size)]
-        spanning_tree = set()
-        start_x, start_y = random.randint(0, self.size - 1), random.randint(0, self.size - 1)
-        self.dfs(start_x, start_y, visited, spanning_tree)
-        return spanning_tree
-
-    def dfs(self, x, y, visited, spanning_tree):
-        visited[x][y] = True
-        directions = list(DIRECTIONS.items())
-        random.shuffle(directions)
-        for dir_name, (dx, dy) in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.size and 0 <= ny < self.size and not visited[nx][ny]:
-                spanning_tree.add(((x, y), (nx, ny)))
-                spanning_tree.add(((nx, ny), (x, y)))
-                self.dfs(nx, ny, visited, spanning_tree)
-
-    def set_doors(self):
-        for x in range(self.size):
-            for y in range(self.size):
-                room = self.grid[x][y]
-                for dir_name, (dx, dy) in DIRECTIONS.items():
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < self.size and 0 <= ny < self.size:
-                        edge = ((x, y), (nx, ny))
-                        if edge in self.spanning_tree:
-                            room.doors[dir_name] = True
-                            self.grid[nx][ny].doors[REVERSE_DIRECTIONS[dir_name]] = True
-                        elif random.random() < 0.25:
-                            room.doors[dir_name] = True
-                            self.grid[nx][ny].doors[REVERSE_DIRECTIONS[dir_name]] = True
-
-    def update(self):
-        if time.time() - self.last_shift > 5:
-            for x in range(self.size):
-                for y in range(self.size):
-                    room = self.grid[x][y]
-                    if not self.stabilized_regions[room.region]:
-                        for dir_name, (dx, dy) in DIRECTIONS.items():
-                            nx, ny = x + dx, y + dy
-                            if 0 <= nx < self.size and 0 <= ny < self.size:
-                                edge = ((x, y), (nx, ny))
-                                if edge not in self.spanning_tree:
-                                    open_door = random.random() < 0.2
-                                    room.doors[dir_name] = open_door
-                                    self.grid[nx][ny].doors[REVERSE_DIRECTIONS[dir_name]] = open_door
-            game.audio.play_event('door_shift')
-            self.last_shift = time.time()
-
-        for x in range(self.size):
-            for y in range(self.size):
-                room = self.grid[x][y]
-                if not self.stabilized_regions[room.region] and random.random() < ENTITY_SPAWN_CHANCE:
-                    if not room.entities and (abs(x - game.player.x) > 1 or abs(y - game.player.y) > 1):
-                        room.entities.append("Shadow")
-                        game.audio.play_event('entity_spawn')
-
-    def get_room(self, x, y):
-        return self.grid[x][y]
-
-class Item:
-    def __init__(self, name, clue_text):
-        self.name = name
-        self.clue_text = clue_text
-
-class StoryManager:
-    def __init__(self, house, player):
-        self.house = house
-        self.player = player
-        self.spirits_helped = [False] * 5
-        self.story_items = [
-            Item("Broken Mirror", "Reflections show more than reality. Find where I shattered my image."),
-            Item("Faded Photograph", "A family torn apart. Seek the room where memories burned."),
-            Item("Locked Diary", "Secrets locked away. The key lies in the shadow of betrayal."),
-            Item("Torn Letter", "Words unsent, promises broken. Mend me in the place of silence."),
-            Item("Ancient Pendant", "A bond eternal, now cursed. Return me to the heart of despair.")
-        ]
-        self.clues = [
-            "The mirror broke in the attic, where the eldest took her life.",
-            "The fire consumed the study, destroying the family's legacy.",
-            "The diary's key is hidden in the basement, where trust was broken.",
-            "The letter was torn in the silent dining room, where arguments echoed.",
-            "The pendant was lost in the master bedroom, where love turned to hate."
-        ]
-        self.spirit_locations = [None] * 5
-        self.place_items_and_spirits()
-
-    def place_items_and_spirits(self):
-        for i, item in enumerate(self.story_items):
-            region = i
-            rooms = [room for row in self.house.grid for room in row if room.region == region]
-            item_room = random.choice(rooms)
-            item_room.items.append(item)
-            spirit_room = random.choice([r for r in rooms if r != item_room])
-            spirit_room.clue = self.clues[i]
-            self.spirit_locations[i] = (spirit_room.x, spirit_room.y)
-
-    def update(self):
-        for i in range(5):
-            if not self.spirits_helped[i]:
-                spirit_x, spirit_y = self.spirit_locations[i]
-                spirit_room = self.house.get_room(spirit_x, spirit_y)
-                if self.player.x == spirit_x and self.player.y == spirit_y:
-                    if self.story_items[i].name in [item.name for item in self.player.inventory]:
-                        self.spirits_helped[i] = True
-                        self.house.stabilized_regions[i] = True
-                        self.player.inventory = [item for item in self.player.inventory if item.name != self.story_items[i].name]
-                        game.message = f"You've resolved the spirit's unrest in region {i}. The area stabilizes."
-                        game.audio.play_event('item_pickup')
-                elif spirit_room.clue and not self.player.hiding:
-                    game.message = spirit_room.clue
-
-    def all_spirits_helped(self):
-        return all(self.spirits_helped)
-
-if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+import pygame
+import numpy as np
+import random
+import sys
+import threading
+import math
+import heapq
+from collections import OrderedDict, deque
+from enum import Enum
+import time
+import tracemalloc
+import zlib
+import json
+import struct
+import tempfile
+import hashlib
+import array
+import os
+
+# Constants
+SCREEN_WIDTH = 1024
+SCREEN_HEIGHT = 768
+GRID_SIZE = 12
+ROOM_SIZE = 64
+FPS = 60
+SANITY_DRAIN_RATE = 0.05
+ENTITY_SPAWN_CHANCE = 0.015
+SANITY_THRESHOLD_MED = 50
+SANITY_THRESHOLD_LOW = 25
+FLASHLIGHT_BATTERY_MAX = 100
+FLASHLIGHT_DRAIN_RATE = 0.2
+FLASHLIGHT_RECHARGE_RATE = 0.5
+EXTRA_DOOR_CHANCE = 0.25
+DOOR_SHIFT_CHANCE = 0.2
+NUM_REGIONS = 5
+ENTITY_BUCKET_SIZE = 8
+TEXT_CACHE_SIZE = 128
+DEFAULT_MAZE = 'dfs'
+LARGE_MAZE = 'boruvka'
+LARGE_MAZE_SIZE = 128
+KRUSKAL_CHUNK = 1 << 16
+TICK_RATE = FPS
+DOOR_SHIFT_TICKS = 5 * TICK_RATE
+BATTERY_RECHARGE_TICKS = TICK_RATE
+MESSAGE_TICKS = 180
+CHUNK_SIZE = 16
+CHUNK_LOAD_RADIUS = 1
+CHUNK_IDLE_TICKS = 10 * TICK_RATE
+DORMANT_CHUNK_LIMIT = 4096
+LOD_NEAR_RADIUS = 4
+LOD_MID_RADIUS = 12
+LOD_MID_INTERVAL = 8
+PATH_FIELD_CACHE = 8
+PATH_UNREACHED = 1 << 30
+PATH_REPAIR_PER_SIDE = 1
+PURSUIT_RADIUS = LOD_MID_RADIUS
+SHADOW_MOVE_TICKS = 2 * TICK_RATE
+SNAPSHOT_MAGIC = b'ECHOSNAP'
+SNAPSHOT_PREFIX = '<8sII'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGN = 64
+SNAPSHOT_FILE = 'echoes.snap'
+SNAPSHOT_CHECK_TICKS = 10 * TICK_RATE
+INPUT_LOG_MAGIC = b'ECHOLOG\0'
+INPUT_LOG_VERSION = 2
+INPUT_LOG_HEADER = '<8sIQIBB4d'
+LOG_CHECKPOINT = 0xFE
+LOG_END = 0xFF
+CHECKPOINT_TICKS = 10 * TICK_RATE
+PROFILE_FRAMES = 10 * FPS
+PROFILE_OVERLAY_FRAMES = FPS // 2
+PROFILE_CSV_FILE = 'echoes_profile.csv'
+PROFILE_TRACE_FILE = 'echoes_profile.json'
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRAY = (80, 80, 80)
+DARK_GRAY = (40, 40, 40)
+RED = (200, 0, 0)
+DARK_RED = (100, 0, 0)
+BLUE = (0, 120, 255)
+YELLOW = (255, 255, 0)
+
+# Sounds
+AMBIENT_SOUND_FILES = {
+    'normal': 'ambient_normal.wav',
+    'low_sanity': 'ambient_low_sanity.wav',
+    'entity_near': 'entity_near.wav'
+}
+EVENT_SOUND_FILES = {
+    'door_shift': 'door_shift.wav',
+    'item_pickup': 'item_pickup.wav',
+    'entity_spawn': 'entity_spawn.wav',
+    'flashlight_toggle': 'flashlight_toggle.wav'
+}
+
+AUDIO_CHANNELS = 12
+AMBIENT_CHANNELS = 2
+AMBIENT_FADE_MS = 1500
+DEFAULT_VOICE_LIMIT = 2
+EVENT_VOICE_LIMITS = {
+    'door_shift': 1,
+    'entity_spawn': 3,
+    'flashlight_toggle': 1
+}
+
+# Directions
+DIRECTIONS = {
+    'north': (0, -1),
+    'south': (0, 1),
+    'east': (1, 0),
+    'west': (-1, 0)
+}
+REVERSE_DIRECTIONS = {'north': 'south', 'south': 'north', 'east': 'west', 'west': 'east'}
+DOOR_BITS = {'north': 1, 'south': 2, 'east': 4, 'west': 8}
+
+ROOM_DESCRIPTIONS = [
+    "A forsaken bedroom, its furniture draped in shadows.",
+    "A narrow hallway, echoing with distant whispers.",
+    "A desolate study, books scattered like forgotten memories.",
+    "A dining room, where the table is set for no one.",
+    "A shadowy attic, filled with cobwebs and secrets.",
+    "A cold basement, the air thick with dampness."
+]
+
+# Player actions accepted by Simulation.act
+ACTIONS = ('north', 'south', 'east', 'west', 'interact', 'flashlight', 'hide')
+
+class GameState(Enum):
+    PLAYING = 0
+    PAUSED = 1
+    GAME_OVER = 2
+    VICTORY = 3
+
+class EventType(Enum):
+    MESSAGE = 0
+    SOUND = 1
+    PLAYER_MOVED = 2
+    DOORS_SHIFTED = 3
+    REGION_STABILIZED = 4
+    ITEM_PICKED_UP = 5
+
+class NullAudio:
+    load_time = 0.0
+
+    def update(self, player_sanity, entities_near):
+        pass
+
+    def play_event(self, event_name):
+        pass
+
+class AudioManager:
+    def __init__(self):
+        self.ambient_sounds = {}
+        self.event_sounds = {}
+        self.current_ambient = None
+        self.load_time = None
+        pygame.mixer.set_num_channels(AUDIO_CHANNELS)
+        pygame.mixer.set_reserved(AMBIENT_CHANNELS)
+        self.ambient_channels = [pygame.mixer.Channel(i) for i in range(AMBIENT_CHANNELS)]
+        self.ambient_volumes = [0.0] * AMBIENT_CHANNELS
+        self.ambient_targets = [0.0] * AMBIENT_CHANNELS
+        self.ambient_playing = [None] * AMBIENT_CHANNELS
+        self.voices = [pygame.mixer.Channel(i) for i in range(AMBIENT_CHANNELS, AUDIO_CHANNELS)]
+        self.voice_sounds = [None] * len(self.voices)
+        self.pending_events = []
+        self.last_update = time.perf_counter()
+        self.loader = threading.Thread(target=self.load_sounds, name="audio-loader", daemon=True)
+        self.loader.start()
+
+    def load_sounds(self):
+        # Sounds become available one by one; a missing file just stays silent
+        start = time.perf_counter()
+        for sounds, files in ((self.ambient_sounds, AMBIENT_SOUND_FILES), (self.event_sounds, EVENT_SOUND_FILES)):
+            for name, path in files.items():
+                try:
+                    sounds[name] = pygame.mixer.Sound(path)
+                except (pygame.error, OSError) as e:
+                    print(f"Could not load sound {path}: {e}", file=sys.stderr)
+        self.load_time = time.perf_counter() - start
+
+    def update(self, player_sanity, entities_near):
+        self.update_ambient(player_sanity, entities_near)
+        self.flush_events()
+
+    def update_ambient(self, player_sanity, entities_near):
+        if player_sanity < SANITY_THRESHOLD_LOW or entities_near:
+            name = 'entity_near'
+        elif player_sanity < SANITY_THRESHOLD_MED:
+            name = 'low_sanity'
+        else:
+            name = 'normal'
+        if name != self.current_ambient and name in self.ambient_sounds:
+            self.current_ambient = name
+            if name in self.ambient_playing:
+                slot = self.ambient_playing.index(name)
+            else:
+                slot = self.ambient_volumes.index(min(self.ambient_volumes))
+                self.ambient_channels[slot].set_volume(0.0)
+                self.ambient_channels[slot].play(self.ambient_sounds[name], loops=-1)
+                self.ambient_volumes[slot] = 0.0
+                self.ambient_playing[slot] = name
+            self.ambient_targets = [1.0 if i == slot else 0.0 for i in range(AMBIENT_CHANNELS)]
+
+        # Move each ambient channel towards its target volume at a fixed rate
+        now = time.perf_counter()
+        fade_step = (now - self.last_update) * 1000 / AMBIENT_FADE_MS
+        self.last_update = now
+        for i, channel in enumerate(self.ambient_channels):
+            volume, target = self.ambient_volumes[i], self.ambient_targets[i]
+            if volume == target:
+                continue
+            volume = min(target, volume + fade_step) if volume < target else max(target, volume - fade_step)
+            self.ambient_volumes[i] = volume
+            if volume == 0.0:
+                channel.stop()
+                self.ambient_playing[i] = None
+            else:
+                channel.set_volume(volume)
+
+    def play_event(self, event_name):
+        if event_name not in self.pending_events:
+            self.pending_events.append(event_name)
+
+    def flush_events(self):
+        # At most one play per sound per frame, capped per sound and by the voice pool
+        for name in self.pending_events:
+            sound = self.event_sounds.get(name)
+            if sound is None:
+                continue
+            busy = [voice.get_busy() for voice in self.voices]
+            active = sum(1 for i, playing in enumerate(self.voice_sounds) if busy[i] and playing == name)
+            if active >= EVENT_VOICE_LIMITS.get(name, DEFAULT_VOICE_LIMIT):
+                continue
+            if False not in busy:
+                continue
+            i = busy.index(False)
+            self.voices[i].play(sound)
+            self.voice_sounds[i] = name
+        self.pending_events.clear()
+
+class TextCache:
+    def __init__(self, maxsize=TEXT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+class NullProfiler:
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
+
+class FrameProfiler:
+    # Each mark() charges the time since the previous mark to a phase. Every
+    # phase keeps a ring buffer of its last `capacity` frames, and the raw
+    # spans of those frames are kept for trace export.
+    def __init__(self, capacity=PROFILE_FRAMES):
+        self.capacity = capacity
+        self.frame = 0
+        self.totals = np.zeros(capacity)
+        self.phases = {}
+        self.frames = deque(maxlen=capacity)
+        self.current = {}
+        self.spans = []
+        self.frame_start = self.last = time.perf_counter()
+
+    def begin_frame(self):
+        self.frame_start = self.last = time.perf_counter()
+        self.current = {}
+        self.spans = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + now - self.last
+        self.spans.append((phase, self.last, now - self.last))
+        self.last = now
+
+    def end_frame(self):
+        i = self.frame % self.capacity
+        self.totals[i] = time.perf_counter() - self.frame_start
+        for phase in self.current:
+            if phase not in self.phases:
+                self.phases[phase] = np.zeros(self.capacity)
+        for phase, durations in self.phases.items():
+            durations[i] = self.current.get(phase, 0.0)
+        self.frames.append((self.frame_start, self.spans))
+        self.frame += 1
+
+    def recent(self, durations):
+        # Oldest to newest
+        if self.frame < self.capacity:
+            return durations[:self.frame]
+        return np.roll(durations, -(self.frame % self.capacity))
+
+    def percentiles(self, durations, q=(50, 95, 99)):
+        recent = self.recent(durations)
+        return np.percentile(recent, q) if recent.size else np.zeros(len(q))
+
+    def summary(self):
+        # p50/p95/p99/max in ms for the whole frame, then for each phase. Max
+        # is included because periodic spikes such as door shifts are rarer than 1%.
+        quantiles = (50, 95, 99, 100)
+        rows = [('frame', self.percentiles(self.totals, quantiles) * 1000)]
+        for phase, durations in self.phases.items():
+            rows.append((phase, self.percentiles(durations, quantiles) * 1000))
+        return rows
+
+    def export_csv(self, path=PROFILE_CSV_FILE):
+        phases = list(self.phases)
+        columns = [self.recent(self.totals)] + [self.recent(self.phases[phase]) for phase in phases]
+        with open(path, 'w') as f:
+            f.write(",".join(['frame', 'total_ms'] + [f"{phase}_ms" for phase in phases]) + "\n")
+            first = self.frame - len(columns[0])
+            for row, values in enumerate(zip(*columns)):
+                f.write(",".join([str(first + row)] + [f"{value * 1000:.4f}" for value in values]) + "\n")
+
+    def export_chrome_trace(self, path=PROFILE_TRACE_FILE):
+        # Complete ("X") events in microseconds, one track for frames and one for phases
+        events = []
+        for frame_start, spans in self.frames:
+            end = spans[-1][1] + spans[-1][2] if spans else frame_start
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': frame_start * 1e6, 'dur': (end - frame_start) * 1e6})
+            for phase, start, duration in spans:
+                events.append({'name': phase, 'ph': 'X', 'pid': 0, 'tid': 1, 'ts': start * 1e6, 'dur': duration * 1e6})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+class Renderer:
+    def __init__(self, game):
+        self.game = game
+        self.screen = game.screen
+        self.screen_rect = self.screen.get_rect()
+        self.room_rect = pygame.Rect(50, 50, SCREEN_WIDTH - 300, SCREEN_HEIGHT - 100)
+        self.minimap_rect = pygame.Rect(SCREEN_WIDTH - 250, 50, 200, 200)
+        self.hud_rect = pygame.Rect(50, SCREEN_HEIGHT - 80, SCREEN_WIDTH - 100, 50)
+        self.message_rect = pygame.Rect(50, SCREEN_HEIGHT // 2 - 50, SCREEN_WIDTH - 100, 100)
+        self.profile_rect = pygame.Rect(SCREEN_WIDTH - 330, 270, 320, 380)
+        self.room_base = pygame.Surface(self.room_rect.size).convert()
+        self.room_surface = pygame.Surface(self.room_rect.size).convert()
+        self.minimap_surface = pygame.Surface(self.minimap_rect.size).convert()
+        self.distortion_surface = pygame.Surface(self.screen_rect.size).convert()
+        self.distortion_surface.fill((100, 0, 0))
+        self.message_surface = pygame.Surface(self.message_rect.size, pygame.SRCALPHA)
+        self.pause_surface = pygame.Surface(self.screen_rect.size, pygame.SRCALPHA)
+        self.pause_surface.fill((0, 0, 0, 150))
+        self.profile_surface = pygame.Surface(self.profile_rect.size, pygame.SRCALPHA)
+        self.text_cache = TextCache()
+        pause_text = self.text_cache.render(game.font, "PAUSED - Press P to resume", WHITE)
+        self.pause_surface.blit(pause_text, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2))
+        self.hud_texts = []
+        self.keys = {}
+        self.room_dynamic = False
+        self.minimap_dirty = True
+
+    def handle_event(self, event_type, payload):
+        if event_type in (EventType.PLAYER_MOVED, EventType.DOORS_SHIFTED, EventType.REGION_STABILIZED):
+            self.minimap_dirty = True
+
+    def layer_keys(self):
+        game = self.game
+        player, house = game.player, game.house
+        px, py = player.x, player.y
+        return {
+            'room': (px, py, int(house.doors[px, py]), player.flashlight_on),
+            'hud': (int(player.sanity), int(player.flashlight_battery), player.inventory.names),
+            'message': game.sim.message,
+            'distortion': game.distortion_alpha if player.sanity < SANITY_THRESHOLD_MED else None,
+            'pause': game.state == GameState.PAUSED,
+            'profile': game.profiler.frame // PROFILE_OVERLAY_FRAMES if game.show_profile else None
+        }
+
+    def build_room(self):
+        player = self.game.player
+        doors = self.game.house.doors[player.x, player.y]
+        self.room_base.fill((20, 20, 20))
+        pygame.draw.rect(self.room_base, GRAY, (50, 50, SCREEN_WIDTH - 400, SCREEN_HEIGHT - 200), 5)
+        door_color = YELLOW if player.flashlight_on else GRAY
+        for dir_name, (dx, dy) in DIRECTIONS.items():
+            if doors & DOOR_BITS[dir_name]:
+                door_x = (SCREEN_WIDTH - 300) // 2 + dx * 150
+                door_y = (SCREEN_HEIGHT - 100) // 2 + dy * 150
+                pygame.draw.rect(self.room_base, door_color, (door_x - 25, door_y - 25, 50, 50))
+        self.room_surface.blit(self.room_base, (0, 0))
+
+    def draw_room_contents(self):
+        player = self.game.player
+        room = self.game.house.get_room(player.x, player.y)
+        self.room_surface.blit(self.room_base, (0, 0))
+        for item in room.items:
+            item_x = random.randint(100, SCREEN_WIDTH - 400)
+            item_y = random.randint(100, SCREEN_HEIGHT - 200)
+            pygame.draw.circle(self.room_surface, BLUE, (item_x, item_y), 10)
+        for entity in room.entities:
+            entity_x = random.randint(100, SCREEN_WIDTH - 400)
+            entity_y = random.randint(100, SCREEN_HEIGHT - 200)
+            pygame.draw.circle(self.room_surface, RED, (entity_x, entity_y), 15)
+            if player.flashlight_on:
+                # Translucent white ring as it appears over the dark room
+                pygame.draw.circle(self.room_surface, (100, 100, 100), (entity_x, entity_y), 20, 2)
+
+    def build_minimap(self):
+        player, house = self.game.player, self.game.house
+        self.minimap_surface.fill(BLACK)
+        for x in range(player.x - 2, player.x + 3):
+            for y in range(player.y - 2, player.y + 3):
+                if not house.in_bounds(x, y):
+                    continue
+                map_x = (x - (player.x - 2)) * 40 + 10
+                map_y = (y - (player.y - 2)) * 40 + 10
+                color = GRAY if house.stabilized_regions[house.regions[x, y]] else DARK_GRAY
+                pygame.draw.rect(self.minimap_surface, color, (map_x, map_y, 35, 35))
+                doors = house.doors[x, y]
+                for dir_name, (dx, dy) in DIRECTIONS.items():
+                    if doors & DOOR_BITS[dir_name]:
+                        door_x = map_x + 17 + dx * 17
+                        door_y = map_y + 17 + dy * 17
+                        pygame.draw.rect(self.minimap_surface, WHITE, (door_x - 5, door_y - 5, 10, 10))
+        pygame.draw.rect(self.minimap_surface, RED, (90, 90, 35, 35), 2)
+
+    def build_hud(self):
+        game = self.game
+        sanity, battery, inventory = self.keys['hud']
+        render = self.text_cache.render
+        self.hud_texts = [
+            (render(game.font, f"Sanity: {sanity}", WHITE), (50, SCREEN_HEIGHT - 80)),
+            (render(game.font, f"Battery: {battery}%", WHITE), (250, SCREEN_HEIGHT - 80)),
+            (render(game.small_font, "Inventory: " + ", ".join(inventory), WHITE), (50, SCREEN_HEIGHT - 50))
+        ]
+
+    def build_message(self):
+        self.message_surface.fill((0, 0, 0, 200))
+        msg_render = self.text_cache.render(self.game.font, self.keys['message'], DARK_RED)
+        self.message_surface.blit(msg_render, (10, 10))
+
+    def build_profile(self):
+        # Rendered directly: the numbers change too often for the text cache
+        font = self.game.small_font
+        self.profile_surface.fill((0, 0, 0, 180))
+        rows = [("ms", ("p50", "p95", "p99", "max"))]
+        rows += [(label, [f"{value:.2f}" for value in values]) for label, values in self.game.profiler.summary()]
+        for i, (label, cells) in enumerate(rows):
+            y = 8 + i * 20
+            self.profile_surface.blit(font.render(label, True, YELLOW), (8, y))
+            for column, cell in enumerate(cells):
+                text = font.render(cell, True, YELLOW)
+                self.profile_surface.blit(text, (165 + column * 50 - text.get_width(), y))
+
+    def compose(self, rect):
+        self.screen.set_clip(rect)
+        self.screen.fill(BLACK)
+        self.screen.blit(self.room_surface, self.room_rect)
+        self.screen.blit(self.minimap_surface, self.minimap_rect)
+        for text, pos in self.hud_texts:
+            self.screen.blit(text, pos)
+        if self.keys['distortion'] is not None:
+            self.distortion_surface.set_alpha(self.keys['distortion'])
+            self.screen.blit(self.distortion_surface, (0, 0))
+        if self.keys['message']:
+            self.screen.blit(self.message_surface, self.message_rect)
+        if self.keys['profile'] is not None:
+            self.screen.blit(self.profile_surface, self.profile_rect)
+        if self.keys['pause']:
+            self.screen.blit(self.pause_surface, (0, 0))
+        self.screen.set_clip(None)
+
+    def draw(self):
+        profiler = self.game.profiler
+        keys = self.layer_keys()
+        changed = {name for name, key in keys.items() if self.keys.get(name, ()) != key}
+        self.keys = keys
+        dirty = []
+        if 'room' in changed:
+            self.build_room()
+            dirty.append(self.room_rect)
+        room = self.game.house.get_room(self.game.player.x, self.game.player.y)
+        dynamic = bool(room.items or self.game.house.entities[room.x, room.y])
+        if dynamic:
+            self.draw_room_contents()
+        elif self.room_dynamic and 'room' not in changed:
+            self.room_surface.blit(self.room_base, (0, 0))
+        if dynamic or self.room_dynamic:
+            dirty.append(self.room_rect)
+        self.room_dynamic = dynamic
+        profiler.mark('draw_room')
+        if self.minimap_dirty:
+            self.build_minimap()
+            self.minimap_dirty = False
+            dirty.append(self.minimap_rect)
+        profiler.mark('draw_minimap')
+        if 'hud' in changed:
+            self.build_hud()
+            dirty.append(self.hud_rect)
+        if 'message' in changed:
+            if keys['message']:
+                self.build_message()
+            dirty.append(self.message_rect)
+        if 'profile' in changed:
+            if keys['profile'] is not None:
+                self.build_profile()
+            dirty.append(self.profile_rect)
+        if 'distortion' in changed or 'pause' in changed:
+            dirty = [self.screen_rect]
+        profiler.mark('draw_text')
+
+        if not dirty:
+            return
+        if len(dirty) > 1:
+            dirty = [rect for i, rect in enumerate(dirty) if rect not in dirty[:i]]
+        for rect in dirty:
+            self.compose(rect)
+        profiler.mark('compose')
+        pygame.display.update(dirty)
+        profiler.mark('present')
+
+KEY_ACTIONS = {
+    pygame.K_UP: 'north',
+    pygame.K_DOWN: 'south',
+    pygame.K_LEFT: 'west',
+    pygame.K_RIGHT: 'east',
+    pygame.K_SPACE: 'interact',
+    pygame.K_f: 'flashlight',
+    pygame.K_h: 'hide'
+}
+
+class Game:
+    def __init__(self, seed=None, endless=False, audio=True, show_timings=False, record=None):
+        self.startup_timings = {}
+        self.show_timings = show_timings
+        self.phase_start = time.perf_counter()
+        pygame.init()
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Echoes of the Forgotten")
+        self.clock = pygame.time.Clock()
+        self.mark_startup('display')
+        self.font = pygame.font.Font(None, 36)
+        self.small_font = pygame.font.Font(None, 24)
+        self.mark_startup('fonts')
+        self.state = GameState.PLAYING
+        self.profiler = FrameProfiler()
+        self.show_profile = False
+        self.sim = Simulation(seed, endless=endless)
+        self.sim.profiler = self.profiler
+        self.player = self.sim.player
+        self.house = self.sim.house
+        self.story = self.sim.story
+        self.record_path = record
+        self.recorder = InputRecorder(self.sim) if record else None
+        self.mark_startup('house')
+        self.audio = AudioManager() if audio and pygame.mixer.get_init() else NullAudio()
+        self.mark_startup('audio')
+        self.distortion_alpha = 0
+        self.renderer = Renderer(self)
+        self.mark_startup('renderer')
+
+    def mark_startup(self, phase):
+        now = time.perf_counter()
+        self.startup_timings[phase] = now - self.phase_start
+        self.phase_start = now
+
+    def report_startup(self):
+        total = sum(self.startup_timings.values())
+        phases = ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in self.startup_timings.items())
+        print(f"Startup {total * 1000:.1f} ms: {phases}")
+        print(f"Maze '{self.sim.maze}' generated in {self.house.generation_time * 1000:.1f} ms")
+
+    def run(self):
+        audio_reported = False
+        try:
+            while self.state != GameState.GAME_OVER and self.state != GameState.VICTORY:
+                self.profiler.begin_frame()
+                self.handle_events()
+                self.profiler.mark('events')
+                if self.state == GameState.PLAYING:
+                    self.update()
+                self.draw()
+                self.profiler.end_frame()
+                if 'first_frame' not in self.startup_timings:
+                    self.mark_startup('first_frame')
+                    if self.show_timings:
+                        self.report_startup()
+                if self.show_timings and not audio_reported and self.audio.load_time is not None:
+                    print(f"Audio loaded in background in {self.audio.load_time * 1000:.1f} ms")
+                    audio_reported = True
+                self.clock.tick(FPS)
+        finally:
+            if self.recorder is not None:
+                self.recorder.save(self.record_path)
+        pygame.quit()
+        sys.exit()
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.state = GameState.GAME_OVER
+            elif event.type == pygame.KEYDOWN:
+                if self.state == GameState.PLAYING and event.key in KEY_ACTIONS:
+                    if self.recorder is not None:
+                        self.recorder.record(KEY_ACTIONS[event.key])
+                    self.sim.act(KEY_ACTIONS[event.key])
+                if event.key == pygame.K_p:
+                    self.state = GameState.PAUSED if self.state == GameState.PLAYING else GameState.PLAYING
+                elif event.key == pygame.K_F5:
+                    self.save()
+                elif event.key == pygame.K_F9:
+                    self.load()
+                elif event.key == pygame.K_F3:
+                    self.show_profile = not self.show_profile
+                elif event.key == pygame.K_F4:
+                    self.export_profile()
+
+    def export_profile(self):
+        try:
+            self.profiler.export_csv()
+            self.profiler.export_chrome_trace()
+            print(f"Frame profile written to {PROFILE_CSV_FILE} and {PROFILE_TRACE_FILE}")
+        except OSError as e:
+            print(f"Could not write frame profile: {e}", file=sys.stderr)
+
+    def save(self):
+        try:
+            save_snapshot(self.sim)
+            self.sim.say("Your memories settle into place.")
+        except (OSError, ValueError) as e:
+            print(f"Could not save snapshot: {e}", file=sys.stderr)
+
+    def load(self):
+        try:
+            sim = load_snapshot(copy=True)
+        except (OSError, ValueError) as e:
+            print(f"Could not load snapshot: {e}", file=sys.stderr)
+            return
+        if self.recorder is not None:
+            # A loaded snapshot cannot be reproduced from the recorded seed
+            self.recorder.save(self.record_path)
+            self.recorder = None
+            print(f"Recording stopped at tick {self.sim.tick}; saved to {self.record_path}", file=sys.stderr)
+        self.sim = sim
+        self.sim.profiler = self.profiler
+        self.player = sim.player
+        self.house = sim.house
+        self.story = sim.story
+        self.state = sim.state
+        self.renderer = Renderer(self)
+
+    def update(self):
+        events = self.sim.step()
+        if self.recorder is not None:
+            self.recorder.update()
+        for event_type, payload in events:
+            if event_type == EventType.SOUND:
+                self.audio.play_event(payload)
+            else:
+                self.renderer.handle_event(event_type, payload)
+        self.profiler.mark('dispatch')
+        self.audio.update(self.player.sanity, self.sim.entities_near)
+        self.profiler.mark('audio')
+        if self.sim.state != GameState.PLAYING:
+            self.state = self.sim.state
+
+        self.distortion_alpha = max(0, 255 - int(self.player.sanity * 2.55))
+        if self.player.sanity < SANITY_THRESHOLD_LOW:
+            self.distortion_alpha = min(255, self.distortion_alpha + random.randint(-20, 20))
+
+    def draw(self):
+        self.renderer.draw()
+
+class Inventory:
+    def __init__(self):
+        self.items = []
+        self.by_name = {}
+        self.names = ()
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def add(self, item):
+        self.items.append(item)
+        self.by_name.setdefault(item.name, []).append(item)
+        self.names = self.names + (item.name,)
+
+    def remove(self, name):
+        matches = self.by_name[name]
+        item = matches.pop(0)
+        if not matches:
+            del self.by_name[name]
+        self.items.remove(item)
+        self.names = tuple(item.name for item in self.items)
+        return item
+
+class Player:
+    def __init__(self, sim):
+        self.sim = sim
+        self.x = sim.rng.randint(0, sim.size - 1)
+        self.y = sim.rng.randint(0, sim.size - 1)
+        self.sanity = 100
+        self.inventory = Inventory()
+        self.hiding = False
+        self.flashlight_on = False
+        self.flashlight_battery = FLASHLIGHT_BATTERY_MAX
+        self.last_battery_recharge = sim.tick
+
+    def move(self, direction):
+        if self.hiding:
+            self.sim.say("You cannot move while hiding.")
+            return
+        house = self.sim.house
+        dx, dy = DIRECTIONS[direction]
+        new_x, new_y = self.x + dx, self.y + dy
+        current_room = house.get_room(self.x, self.y)
+        if current_room.doors[direction]:
+            if house.in_bounds(new_x, new_y):
+                self.x, self.y = new_x, new_y
+                new_room = house.get_room(self.x, self.y)
+                message = f"You move {direction} into {new_room.description}."
+                if new_room.entities and not self.flashlight_on:
+                    message += " A shadow watches you!"
+                self.sim.say(message)
+                self.sim.emit(EventType.PLAYER_MOVED, (new_x, new_y))
+            else:
+                self.sim.say("An unseen force blocks your path.")
+        else:
+            self.sim.say("The passage is sealed.")
+
+    def interact(self):
+        current_room = self.sim.house.get_room(self.x, self.y)
+        if self.hiding:
+            self.hiding = False
+            self.sim.say("You emerge from hiding.")
+            return
+        if current_room.items:
+            item = self.sim.house.take_item(self.x, self.y)
+            self.inventory.add(item)
+            self.sim.say(f"You picked up {item.name}.")
+            self.sim.play('item_pickup')
+            self.sim.emit(EventType.ITEM_PICKED_UP, item)
+        elif current_room.entities and not self.hiding:
+            self.hiding = True
+            self.sim.say("You hide in the shadows, holding your breath.")
+        elif not current_room.items and not current_room.entities:
+            self.sim.say("There's nothing to interact with here.")
+
+    def toggle_flashlight(self):
+        if self.hiding:
+            self.sim.say("You cannot use the flashlight while hiding.")
+            return
+        if self.flashlight_battery <= 0:
+            self.sim.say("Your flashlight battery is drained.")
+            return
+        self.flashlight_on = not self.flashlight_on
+        self.sim.say(f"Flashlight {'on' if self.flashlight_on else 'off'}.")
+        self.sim.play('flashlight_toggle')
+
+    def toggle_hiding(self):
+        if not self.hiding and self.sim.house.get_room(self.x, self.y).entities:
+            self.hiding = True
+            self.sim.say("You hide from the lurking shadow.")
+        elif self.hiding:
+            self.hiding = False
+            self.sim.say("You stop hiding.")
+
+    def update(self):
+        if not self.hiding:
+            self.sanity -= self.sim.tuning.sanity_drain_rate
+            house = self.sim.house
+            if house.entity_index.count_at(self.x, self.y):
+                if self.flashlight_on:
+                    house.clear_entities(self.x, self.y)
+                    self.sim.say("The flashlight repels the shadow!")
+                else:
+                    self.sanity -= 1.5
+            if self.flashlight_on:
+                self.flashlight_battery -= self.sim.tuning.flashlight_drain_rate
+                if self.flashlight_battery <= 0:
+                    self.flashlight_on = False
+                    self.sim.say("Your flashlight battery has died.")
+        else:
+            self.sanity -= 0.8
+
+        if self.sim.tick - self.last_battery_recharge >= BATTERY_RECHARGE_TICKS:
+            self.flashlight_battery = min(FLASHLIGHT_BATTERY_MAX, self.flashlight_battery + FLASHLIGHT_RECHARGE_RATE)
+            self.last_battery_recharge = self.sim.tick
+
+class Room:
+    __slots__ = ('house', 'x', 'y')
+
+    def __init__(self, house, x, y):
+        self.house = house
+        self.x = x
+        self.y = y
+
+    @property
+    def doors(self):
+        mask = self.house.doors[self.x, self.y]
+        return {dir_name: bool(mask & bit) for dir_name, bit in DOOR_BITS.items()}
+
+    @property
+    def entities(self):
+        return ["Shadow"] * int(self.house.entities[self.x, self.y])
+
+    @entities.setter
+    def entities(self, entities):
+        self.house.clear_entities(self.x, self.y)
+        if entities:
+            self.house.entities[self.x, self.y] = len(entities)
+            self.house.entity_index.add(self.x, self.y, len(entities))
+
+    @property
+    def items(self):
+        return self.house.items.get((self.x, self.y), [])
+
+    @property
+    def clue(self):
+        return self.house.clues.get((self.x, self.y))
+
+    @property
+    def description(self):
+        return ROOM_DESCRIPTIONS[self.house.descriptions[self.x, self.y]]
+
+    @property
+    def region(self):
+        return int(self.house.regions[self.x, self.y])
+
+def region_table(size):
+    xs, ys = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    top = ys < size // 2
+    regions = np.full((size, size), 4, dtype=np.uint8)
+    regions[top & (xs >= 2 * size // 3)] = 2
+    regions[top & (xs >= size // 3) & (xs < 2 * size // 3)] = 1
+    regions[top & (xs < size // 3)] = 0
+    regions[~top & (xs < size // 2)] = 3
+    return regions
+
+def edges_to_mask(east, south):
+    size = east.shape[1]
+    mask = np.zeros((size, size), dtype=np.uint8)
+    mask[:-1, :] |= east * np.uint8(DOOR_BITS['east'])
+    mask[1:, :] |= east * np.uint8(DOOR_BITS['west'])
+    mask[:, :-1] |= south * np.uint8(DOOR_BITS['south'])
+    mask[:, 1:] |= south * np.uint8(DOOR_BITS['north'])
+    return mask
+
+def mask_to_edges(mask):
+    east = (mask[:-1, :] & DOOR_BITS['east']) != 0
+    south = (mask[:, :-1] & DOOR_BITS['south']) != 0
+    return east, south
+
+def shift_door_mask(doors, fixed, unstable, np_rng):
+    # Re-roll every edge touching an unstable cell, except those held open by fixed
+    fixed_east, fixed_south = mask_to_edges(fixed)
+    east, south = mask_to_edges(doors)
+    new_east = np_rng.random(east.shape) < DOOR_SHIFT_CHANCE
+    new_south = np_rng.random(south.shape) < DOOR_SHIFT_CHANCE
+    shift_east = (unstable[:-1, :] | unstable[1:, :]) & ~fixed_east
+    shift_south = (unstable[:, :-1] | unstable[:, 1:]) & ~fixed_south
+    east = np.where(shift_east, new_east, east)
+    south = np.where(shift_south, new_south, south)
+    return fixed | edges_to_mask(east, south)
+
+def grid_edges(size):
+    # Flat cell ids (x * size + y) of every east edge followed by every south edge
+    cells = np.arange(size * size, dtype=np.int32).reshape(size, size)
+    u = np.concatenate([cells[:-1, :].ravel(), cells[:, :-1].ravel()])
+    v = np.concatenate([cells[1:, :].ravel(), cells[:, 1:].ravel()])
+    return u, v
+
+def edges_from_flags(size, flags):
+    split = (size - 1) * size
+    return flags[:split].reshape(size - 1, size), flags[split:].reshape(size, size - 1)
+
+def dfs_spanning_tree(size, rng, np_rng):
+    visited = bytearray(size * size)
+    tree = bytearray(size * size)
+    north, south, east, west = (DOOR_BITS[name] for name in ('north', 'south', 'east', 'west'))
+    start = rng.randrange(size * size)
+    visited[start] = 1
+    stack = [start]
+    while stack:
+        cell = stack[-1]
+        x, y = divmod(cell, size)
+        options = []
+        if y > 0 and not visited[cell - 1]:
+            options.append((cell - 1, north, south))
+        if y < size - 1 and not visited[cell + 1]:
+            options.append((cell + 1, south, north))
+        if x < size - 1 and not visited[cell + size]:
+            options.append((cell + size, east, west))
+        if x > 0 and not visited[cell - size]:
+            options.append((cell - size, west, east))
+        if not options:
+            stack.pop()
+            continue
+        neighbor, bit, reverse_bit = options[rng.randrange(len(options))]
+        tree[cell] |= bit
+        tree[neighbor] |= reverse_bit
+        visited[neighbor] = 1
+        stack.append(neighbor)
+    return np.frombuffer(tree, dtype=np.uint8).reshape(size, size).copy()
+
+def kruskal_spanning_tree(size, rng, np_rng):
+    # Edges are walked in chunks and the forest lives in a flat int array, so
+    # the only full-size Python objects are never built
+    u, v = grid_edges(size)
+    order = np_rng.permutation(len(u)).astype(np.int32)
+    parent = array.array('i', range(size * size))
+    chosen = np.zeros(len(u), dtype=bool)
+    remaining = size * size - 1
+    for start in range(0, len(order), KRUSKAL_CHUNK):
+        edges = order[start:start + KRUSKAL_CHUNK]
+        for edge, a, b in zip(edges.tolist(), u[edges].tolist(), v[edges].tolist()):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            while parent[b] != b:
+                parent[b] = parent[parent[b]]
+                b = parent[b]
+            if a != b:
+                parent[a] = b
+                chosen[edge] = True
+                remaining -= 1
+        if not remaining:
+            break
+    return edges_to_mask(*edges_from_flags(size, chosen))
+
+def boruvka_spanning_tree(size, rng, np_rng):
+    # Random edge ranks make the minimum spanning tree a random spanning tree.
+    # Each Boruvka round works only on the surviving edges and their component labels.
+    cu, cv = grid_edges(size)
+    cells, edge_count = size * size, len(cu)
+    order = np_rng.permutation(edge_count).astype(np.int32)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(edge_count, dtype=np.int32)
+    position = np.empty(edge_count, dtype=np.int32)
+    chosen = np.zeros(edge_count, dtype=bool)
+    while len(rank):
+        best = np.full(cells, edge_count, dtype=np.int32)
+        np.minimum.at(best, cu, rank)
+        np.minimum.at(best, cv, rank)
+        roots = np.flatnonzero(best < edge_count).astype(np.int32)
+        chosen[order[best[roots]]] = True
+        position[rank] = np.arange(len(rank), dtype=np.int32)
+        picked = position[best[roots]]
+        ends_u, ends_v = cu[picked], cv[picked]
+        parent = np.arange(cells, dtype=np.int32)
+        targets = np.where(ends_u == roots, ends_v, ends_u)
+        # Two components picking the same edge point at each other; keep the smaller as root
+        parent[roots] = targets
+        mutual = (parent[targets] == roots) & (roots < targets)
+        targets[mutual] = roots[mutual]
+        while True:
+            parent[roots] = targets
+            jumped = parent[targets]
+            if np.array_equal(jumped, targets):
+                break
+            targets = jumped
+        cu, cv = parent[cu], parent[cv]
+        crossing = cu != cv
+        cu, cv, rank = cu[crossing], cv[crossing], rank[crossing]
+    return edges_to_mask(*edges_from_flags(size, chosen))
+
+MAZE_GENERATORS = {
+    'dfs': dfs_spanning_tree,
+    'kruskal': kruskal_spanning_tree,
+    'boruvka': boruvka_spanning_tree
+}
+
+def default_maze(size):
+    # dfs gives the corridor-heavy layout the game is tuned for, but its Python
+    # loop is too slow for big houses, where the vectorized Boruvka takes over
+    return LARGE_MAZE if size >= LARGE_MAZE_SIZE else DEFAULT_MAZE
+
+def profile_maze_generator(name, size, seed=0):
+    # tracemalloc slows the Python-loop generators many times over, so time
+    # one run without it and take the peak from a second run of the same seed
+    start = time.perf_counter()
+    MAZE_GENERATORS[name](size, random.Random(seed), np.random.default_rng(seed))
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    MAZE_GENERATORS[name](size, random.Random(seed), np.random.default_rng(seed))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def measure_maze_generators(sizes=(12, 64, 256, 1000), seed=0):
+    results = []
+    for size in sizes:
+        for name in MAZE_GENERATORS:
+            elapsed, peak = profile_maze_generator(name, size, seed)
+            results.append((name, size, elapsed, peak))
+            print(f"{name} {size}x{size}: {elapsed * 1000:.1f} ms, peak {peak / 2 ** 20:.1f} MiB", flush=True)
+    return results
+
+class EntityIndex:
+    def __init__(self, regions, bucket_size=ENTITY_BUCKET_SIZE):
+        self.regions = regions
+        self.bucket_size = bucket_size
+        self.counts = {}
+        self.buckets = {}
+        self.region_counts = [0] * NUM_REGIONS
+
+    def __len__(self):
+        return len(self.counts)
+
+    def count_at(self, x, y):
+        return self.counts.get((x, y), 0)
+
+    def add(self, x, y, n=1):
+        cell = (x, y)
+        if cell not in self.counts:
+            self.counts[cell] = 0
+            bucket = (x // self.bucket_size, y // self.bucket_size)
+            self.buckets.setdefault(bucket, set()).add(cell)
+        self.counts[cell] += n
+        self.region_counts[self.regions[x, y]] += n
+
+    def remove(self, x, y, n=None):
+        cell = (x, y)
+        count = self.counts.get(cell, 0)
+        if n is None or n >= count:
+            n = count
+        if not n:
+            return 0
+        self.region_counts[self.regions[x, y]] -= n
+        if n == count:
+            del self.counts[cell]
+            bucket = (x // self.bucket_size, y // self.bucket_size)
+            self.buckets[bucket].discard(cell)
+            if not self.buckets[bucket]:
+                del self.buckets[bucket]
+        else:
+            self.counts[cell] = count - n
+        return n
+
+    def move(self, src, dst, n=1):
+        n = self.remove(*src, n)
+        if n:
+            self.add(*dst, n)
+        return n
+
+    def count_in_region(self, region):
+        return self.region_counts[region]
+
+    def iter_within(self, x, y, radius):
+        # Probe cells directly when the square is smaller than a bucket
+        if (2 * radius + 1) ** 2 <= self.bucket_size ** 2:
+            for cx in range(x - radius, x + radius + 1):
+                for cy in range(y - radius, y + radius + 1):
+                    if (cx, cy) in self.counts:
+                        yield cx, cy
+            return
+        size = self.bucket_size
+        for bx in range((x - radius) // size, (x + radius) // size + 1):
+            for by in range((y - radius) // size, (y + radius) // size + 1):
+                for cx, cy in self.buckets.get((bx, by), ()):
+                    if abs(cx - x) <= radius and abs(cy - y) <= radius:
+                        yield cx, cy
+
+    def within(self, x, y, radius):
+        return list(self.iter_within(x, y, radius))
+
+    def any_within(self, x, y, radius):
+        return next(self.iter_within(x, y, radius), None) is not None
+
+class SpawnScheduler:
+    # Rooms near the player roll spawns every tick and mid-range rooms every
+    # LOD_MID_INTERVAL ticks. Far rooms are not touched at all: when a room is
+    # next rolled, its chance covers every tick since its last roll.
+    def __init__(self, house):
+        self.house = house
+        self.last_tick = np.full((house.size, house.size), house.sim.tick, dtype=np.uint32)
+
+    def reset(self, x, y):
+        self.last_tick[x, y] = self.house.sim.tick
+
+    def update(self):
+        house = self.house
+        player = house.sim.player
+        tick = house.sim.tick
+        radius = LOD_MID_RADIUS if tick % LOD_MID_INTERVAL == 0 else LOD_NEAR_RADIUS
+        x0, y0 = max(0, player.x - radius), max(0, player.y - radius)
+        window = (slice(x0, player.x + radius + 1), slice(y0, player.y + radius + 1))
+        unstable = ~house.stabilized_regions[house.regions[window]]
+        if not unstable.any():
+            return 0
+        elapsed = tick - self.last_tick[window]
+        self.last_tick[window] = tick
+        chance = 1 - (1 - house.sim.tuning.entity_spawn_chance) ** elapsed
+        spawn = house.np_rng.random(elapsed.shape) < chance
+        spawn &= unstable
+        entities = house.entities[window]
+        spawn &= entities == 0
+        spawn[max(0, player.x - 1 - x0):player.x + 2 - x0, max(0, player.y - 1 - y0):player.y + 2 - y0] = False
+        if not spawn.any():
+            return 0
+        entities[spawn] += 1
+        cells = np.argwhere(spawn)
+        for x, y in cells.tolist():
+            house.entity_index.add(x0 + x, y0 + y)
+        return len(cells)
+
+class Pursuit:
+    # Shadows within PURSUIT_RADIUS of the player follow one shared flow
+    # field: a BFS from the player's room over open doors, skipping
+    # stabilized regions. The field is rebuilt only when the player moves or
+    # the doors or regions change, and every shadow steps at once.
+    STEPS = ((1, 0, -1), (2, 0, 1), (4, 1, 0), (8, -1, 0))
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.origin = None
+        self.flow = None
+        self.dist = None
+        self.dirty = True
+        for event_type in (EventType.PLAYER_MOVED, EventType.DOORS_SHIFTED, EventType.REGION_STABILIZED):
+            sim.subscribe(event_type, self.invalidate)
+
+    def invalidate(self, payload=None):
+        self.dirty = True
+
+    def window(self):
+        player = self.sim.player
+        x0, y0 = player.x - PURSUIT_RADIUS, player.y - PURSUIT_RADIUS
+        x1, y1 = player.x + PURSUIT_RADIUS + 1, player.y + PURSUIT_RADIUS + 1
+        size = self.sim.house.size
+        if size is not None:
+            x0, y0, x1, y1 = max(0, x0), max(0, y0), min(size, x1), min(size, y1)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def rebuild(self):
+        house = self.sim.house
+        player = self.sim.player
+        x0, y0, w, h = self.window()
+        doors = house.block('doors', x0, y0, w, h)
+        blocked = house.stabilized_regions[house.block('regions', x0, y0, w, h)]
+        dist = np.full((w, h), PATH_UNREACHED, dtype=np.int32)
+        frontier = np.zeros((w, h), dtype=bool)
+        px, py = player.x - x0, player.y - y0
+        if not blocked[px, py]:
+            frontier[px, py] = True
+            dist[px, py] = 0
+        level = 0
+        while frontier.any():
+            level += 1
+            found = np.zeros_like(frontier)
+            found[:, :-1] |= frontier[:, 1:] & (doors[:, 1:] & 1 != 0)
+            found[:, 1:] |= frontier[:, :-1] & (doors[:, :-1] & 2 != 0)
+            found[1:, :] |= frontier[:-1, :] & (doors[:-1, :] & 4 != 0)
+            found[:-1, :] |= frontier[1:, :] & (doors[1:, :] & 8 != 0)
+            frontier = found & ~blocked & (dist == PATH_UNREACHED)
+            dist[frontier] = level
+
+        # Each room points through the first door that leads one step closer
+        flow = np.full((w, h), -1, dtype=np.int8)
+        padded = np.pad(dist, 1, constant_values=PATH_UNREACHED)
+        for i, (bit, dx, dy) in enumerate(self.STEPS):
+            neighbor = padded[1 + dx:w + 1 + dx, 1 + dy:h + 1 + dy]
+            flow[(flow < 0) & (doors & bit != 0) & (neighbor == dist - 1) & (dist > 0)] = i
+        self.origin = (x0, y0)
+        self.dist = dist
+        self.flow = flow
+        self.dirty = False
+
+    def update(self):
+        if self.sim.tick % SHADOW_MOVE_TICKS:
+            return 0
+        if self.dirty:
+            self.rebuild()
+        house = self.sim.house
+        x0, y0 = self.origin
+        w, h = self.flow.shape
+        entities = house.block('entities', x0, y0, w, h)
+        movers = (entities > 0) & (self.flow >= 0)
+        if not movers.any():
+            return 0
+        xs, ys = np.nonzero(movers)
+        steps = np.array(self.STEPS)[self.flow[movers]]
+        counts = entities.astype(np.int64)
+        counts[movers] = 0
+        np.add.at(counts, (xs + steps[:, 1], ys + steps[:, 2]), entities[movers])
+
+        index = house.entity_index
+        for x, y in np.argwhere(counts != entities).tolist():
+            cell_x, cell_y = x0 + x, y0 + y
+            count = int(counts[x, y])
+            house.entities[cell_x, cell_y] = count
+            index.remove(cell_x, cell_y)
+            if count:
+                index.add(cell_x, cell_y, count)
+            elif house.scheduler is not None:
+                house.scheduler.reset(cell_x, cell_y)
+        return len(xs)
+
+class House:
+    def __init__(self, size, sim, maze=None):
+        self.size = size
+        self.sim = sim
+        self.rng = sim.rng
+        self.np_rng = sim.np_rng
+        self.regions = region_table(size)
+        self.descriptions = self.np_rng.integers(0, len(ROOM_DESCRIPTIONS), (size, size), dtype=np.uint8)
+        self.entities = np.zeros((size, size), dtype=np.uint16)
+        self.entity_index = EntityIndex(self.regions)
+        self.items = {}
+        self.clues = {}
+        self.spanning_tree = self.generate_spanning_tree(maze or default_maze(size))
+        self.set_doors()
+        self.stabilized_regions = np.zeros(NUM_REGIONS, dtype=bool)
+        self.last_shift = sim.tick
+        self.scheduler = SpawnScheduler(self)
+
+    @classmethod
+    def from_arrays(cls, sim, arrays, items=None, clues=None, last_shift=0):
+        house = cls.__new__(cls)
+        house.size = arrays['doors'].shape[0]
+        house.sim = sim
+        house.rng = sim.rng
+        house.np_rng = sim.np_rng
+        house.regions = arrays['regions']
+        house.descriptions = arrays['descriptions']
+        house.entities = arrays['entities']
+        house.spanning_tree = arrays['spanning_tree']
+        house.doors = arrays['doors']
+        house.stabilized_regions = arrays['stabilized_regions']
+        house.entity_index = EntityIndex(house.regions)
+        for x, y in np.argwhere(house.entities > 0).tolist():
+            house.entity_index.add(x, y, int(house.entities[x, y]))
+        house.items = items if items is not None else {}
+        house.clues = clues if clues is not None else {}
+        house.last_shift = last_shift
+        house.generation_time = 0.0
+        house.scheduler = SpawnScheduler(house)
+        house.scheduler.last_tick = arrays['last_tick']
+        return house
+
+    def generate_spanning_tree(self, maze):
+        start = time.perf_counter()
+        spanning_tree = MAZE_GENERATORS[maze](self.size, self.rng, self.np_rng)
+        self.generation_time = time.perf_counter() - start
+        return spanning_tree
+
+    def random_edges(self, chance):
+        east = self.np_rng.random((self.size - 1, self.size)) < chance
+        south = self.np_rng.random((self.size, self.size - 1)) < chance
+        return east, south
+
+    def set_doors(self):
+        east, south = self.random_edges(self.sim.tuning.extra_door_chance)
+        self.doors = self.spanning_tree | edges_to_mask(east, south)
+
+    def shift_doors(self):
+        unstable = ~self.stabilized_regions[self.regions]
+        self.doors = shift_door_mask(self.doors, self.spanning_tree, unstable, self.np_rng)
+
+    def clear_entities(self, x, y):
+        self.entities[x, y] = 0
+        if self.scheduler is not None:
+            self.scheduler.reset(x, y)
+        return self.entity_index.remove(x, y)
+
+    def update(self):
+        if self.sim.tick - self.last_shift >= DOOR_SHIFT_TICKS:
+            self.shift_doors()
+            self.sim.emit(EventType.DOORS_SHIFTED)
+            self.sim.play('door_shift')
+            self.last_shift = self.sim.tick
+
+        for _ in range(self.scheduler.update()):
+            self.sim.play('entity_spawn')
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def block(self, name, x, y, width, height):
+        return getattr(self, name)[x:x + width, y:y + height]
+
+    def get_room(self, x, y):
+        return Room(self, x, y)
+
+    def region_cells(self, region):
+        return np.argwhere(self.regions == region)
+
+    def add_item(self, x, y, item):
+        self.items.setdefault((x, y), []).append(item)
+
+    def take_item(self, x, y):
+        items = self.items[(x, y)]
+        item = items.pop(0)
+        if not items:
+            del self.items[(x, y)]
+        return item
+
+class Chunk:
+    __slots__ = ('cx', 'cy', 'doors', 'fixed', 'entities', 'descriptions', 'regions', 'last_touched')
+
+class ChunkedLayer:
+    __slots__ = ('house', 'name')
+
+    def __init__(self, house, name):
+        self.house = house
+        self.name = name
+
+    def __getitem__(self, cell):
+        x, y = cell
+        chunk = self.house.chunk_at(x, y)
+        return getattr(chunk, self.name)[x - chunk.cx * CHUNK_SIZE, y - chunk.cy * CHUNK_SIZE]
+
+    def __setitem__(self, cell, value):
+        x, y = cell
+        chunk = self.house.chunk_at(x, y)
+        getattr(chunk, self.name)[x - chunk.cx * CHUNK_SIZE, y - chunk.cy * CHUNK_SIZE] = value
+
+class TiledRegions:
+    __slots__ = ('table', 'size')
+
+    def __init__(self, size):
+        self.table = region_table(size)
+        self.size = size
+
+    def __getitem__(self, cell):
+        x, y = cell
+        return self.table[x % self.size, y % self.size]
+
+    def block(self, x, y, width, height):
+        return self.table[np.ix_(np.arange(x, x + width) % self.size, np.arange(y, y + height) % self.size)]
+
+def zigzag(n):
+    return 2 * n if n >= 0 else -2 * n - 1
+
+class ChunkedHouse(House):
+    # Endless house: chunks are generated from the seed when touched and evicted when idle
+    def __init__(self, sim, maze=None, tile=GRID_SIZE):
+        self.size = None
+        self.sim = sim
+        self.rng = sim.rng
+        self.np_rng = sim.np_rng
+        self.maze = maze or default_maze(CHUNK_SIZE)
+        self.tile = tile
+        self.regions = TiledRegions(tile)
+        self.doors = ChunkedLayer(self, 'doors')
+        self.entities = ChunkedLayer(self, 'entities')
+        self.descriptions = ChunkedLayer(self, 'descriptions')
+        self.entity_index = EntityIndex(self.regions)
+        self.items = {}
+        self.clues = {}
+        self.chunks = {}
+        self.dormant = OrderedDict()
+        self.generation_time = 0.0
+        self.stabilized_regions = np.zeros(NUM_REGIONS, dtype=bool)
+        self.last_shift = sim.tick
+        self.scheduler = None
+
+    def in_bounds(self, x, y):
+        return True
+
+    def region_cells(self, region):
+        return np.argwhere(self.regions.table == region)
+
+    def block(self, name, x, y, width, height):
+        if name == 'regions':
+            return self.regions.block(x, y, width, height)
+        out = None
+        for cx in range(x // CHUNK_SIZE, (x + width - 1) // CHUNK_SIZE + 1):
+            for cy in range(y // CHUNK_SIZE, (y + height - 1) // CHUNK_SIZE + 1):
+                chunk = self.chunk_at(cx * CHUNK_SIZE, cy * CHUNK_SIZE)
+                layer = getattr(chunk, name)
+                if out is None:
+                    out = np.empty((width, height), dtype=layer.dtype)
+                ox, oy = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+                sx, sy = max(x, ox), max(y, oy)
+                ex, ey = min(x + width, ox + CHUNK_SIZE), min(y + height, oy + CHUNK_SIZE)
+                out[sx - x:ex - x, sy - y:ey - y] = layer[sx - ox:ex - ox, sy - oy:ey - oy]
+        return out
+
+    def chunk_at(self, x, y):
+        key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.load_chunk(*key)
+        chunk.last_touched = self.sim.tick
+        return chunk
+
+    def chunk_rng(self, cx, cy, stream):
+        return np.random.default_rng([self.sim.seed, zigzag(cx), zigzag(cy), stream])
+
+    def boundary(self, cx, cy, stream):
+        # Doors across the east (stream 1) or south (stream 2) face of chunk (cx, cy);
+        # one is always open so neighbouring chunks stay connected.
+        rng = self.chunk_rng(cx, cy, stream)
+        doors = rng.random(CHUNK_SIZE) < self.sim.tuning.extra_door_chance
+        doors[rng.integers(CHUNK_SIZE)] = True
+        return doors
+
+    def load_chunk(self, cx, cy):
+        rng = self.chunk_rng(cx, cy, 0)
+        start = time.perf_counter()
+        tree = MAZE_GENERATORS[self.maze](CHUNK_SIZE, random.Random(int(rng.integers(2 ** 63))), rng)
+        self.generation_time += time.perf_counter() - start
+        chunk = Chunk()
+        chunk.cx, chunk.cy = cx, cy
+        chunk.fixed = tree
+        chunk.fixed[-1, :] |= self.boundary(cx, cy, 1) * np.uint8(DOOR_BITS['east'])
+        chunk.fixed[0, :] |= self.boundary(cx - 1, cy, 1) * np.uint8(DOOR_BITS['west'])
+        chunk.fixed[:, -1] |= self.boundary(cx, cy, 2) * np.uint8(DOOR_BITS['south'])
+        chunk.fixed[:, 0] |= self.boundary(cx, cy - 1, 2) * np.uint8(DOOR_BITS['north'])
+        east = rng.random((CHUNK_SIZE - 1, CHUNK_SIZE)) < self.sim.tuning.extra_door_chance
+        south = rng.random((CHUNK_SIZE, CHUNK_SIZE - 1)) < self.sim.tuning.extra_door_chance
+        chunk.doors = chunk.fixed | edges_to_mask(east, south)
+        chunk.descriptions = rng.integers(0, len(ROOM_DESCRIPTIONS), (CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint8)
+        chunk.regions = self.regions.block(cx * CHUNK_SIZE, cy * CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        chunk.entities = np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint16)
+        chunk.last_touched = self.sim.tick
+        compact = self.dormant.pop((cx, cy), None)
+        if compact is not None:
+            data = np.frombuffer(zlib.decompress(compact), dtype=np.uint8)
+            chunk.doors = data[:CHUNK_SIZE * CHUNK_SIZE].reshape(CHUNK_SIZE, CHUNK_SIZE).copy()
+            chunk.entities = data[CHUNK_SIZE * CHUNK_SIZE:].view(np.uint16).reshape(CHUNK_SIZE, CHUNK_SIZE).copy()
+            for x, y in np.argwhere(chunk.entities).tolist():
+                self.entity_index.add(cx * CHUNK_SIZE + x, cy * CHUNK_SIZE + y, int(chunk.entities[x, y]))
+        self.chunks[(cx, cy)] = chunk
+        return chunk
+
+    def evict_chunk(self, key):
+        chunk = self.chunks.pop(key)
+        for x, y in np.argwhere(chunk.entities).tolist():
+            self.entity_index.remove(chunk.cx * CHUNK_SIZE + x, chunk.cy * CHUNK_SIZE + y)
+        self.dormant[key] = zlib.compress(chunk.doors.tobytes() + chunk.entities.tobytes())
+        if len(self.dormant) > DORMANT_CHUNK_LIMIT:
+            self.dormant.popitem(last=False)
+
+    def update(self):
+        player = self.sim.player
+        pcx, pcy = player.x // CHUNK_SIZE, player.y // CHUNK_SIZE
+        for cx in range(pcx - CHUNK_LOAD_RADIUS, pcx + CHUNK_LOAD_RADIUS + 1):
+            for cy in range(pcy - CHUNK_LOAD_RADIUS, pcy + CHUNK_LOAD_RADIUS + 1):
+                self.chunk_at(cx * CHUNK_SIZE, cy * CHUNK_SIZE)
+
+        if self.sim.tick - self.last_shift >= DOOR_SHIFT_TICKS:
+            for chunk in self.chunks.values():
+                unstable = ~self.stabilized_regions[chunk.regions]
+                chunk.doors = shift_door_mask(chunk.doors, chunk.fixed, unstable, self.np_rng)
+            self.sim.emit(EventType.DOORS_SHIFTED)
+            self.sim.play('door_shift')
+            self.last_shift = self.sim.tick
+
+        spawned = 0
+        for chunk in self.chunks.values():
+            spawn = self.np_rng.random((CHUNK_SIZE, CHUNK_SIZE)) < self.sim.tuning.entity_spawn_chance
+            spawn &= ~self.stabilized_regions[chunk.regions]
+            spawn &= chunk.entities == 0
+            local_x, local_y = player.x - chunk.cx * CHUNK_SIZE, player.y - chunk.cy * CHUNK_SIZE
+            spawn[max(0, local_x - 1):max(0, local_x + 2), max(0, local_y - 1):max(0, local_y + 2)] = False
+            if not spawn.any():
+                continue
+            chunk.entities[spawn] += 1
+            for x, y in np.argwhere(spawn).tolist():
+                self.entity_index.add(chunk.cx * CHUNK_SIZE + x, chunk.cy * CHUNK_SIZE + y)
+                spawned += 1
+        for _ in range(spawned):
+            self.sim.play('entity_spawn')
+
+        if self.sim.tick % TICK_RATE == 0:
+            for key, chunk in list(self.chunks.items()):
+                far = max(abs(chunk.cx - pcx), abs(chunk.cy - pcy)) > CHUNK_LOAD_RADIUS
+                if far and self.sim.tick - chunk.last_touched > CHUNK_IDLE_TICKS:
+                    self.evict_chunk(key)
+
+class Tuning:
+    __slots__ = ('sanity_drain_rate', 'entity_spawn_chance', 'flashlight_drain_rate', 'extra_door_chance')
+
+    def __init__(self, sanity_drain_rate=SANITY_DRAIN_RATE, entity_spawn_chance=ENTITY_SPAWN_CHANCE,
+                 flashlight_drain_rate=FLASHLIGHT_DRAIN_RATE, extra_door_chance=EXTRA_DOOR_CHANCE):
+        self.sanity_drain_rate = sanity_drain_rate
+        self.entity_spawn_chance = entity_spawn_chance
+        self.flashlight_drain_rate = flashlight_drain_rate
+        self.extra_door_chance = extra_door_chance
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class Item:
+    __slots__ = ('name', 'clue_text')
+
+    def __init__(self, name, clue_text):
+        self.name = name
+        self.clue_text = clue_text
+
+class PathService:
+    # Shortest paths over the door graph from a few cached source rooms.
+    # Spanning-tree doors never close, so every room stays reachable. A door
+    # shift only records the new doors; a cached field is brought up to date
+    # when it is next queried, repaired around the flipped edges when few
+    # rooms changed and recomputed otherwise. Fields are int32 arrays; the
+    # per-room door list the scalar walks use is rebuilt on first query.
+    def __init__(self, sim, max_fields=PATH_FIELD_CACHE):
+        self.sim = sim
+        self.house = sim.house
+        self.size = self.house.size
+        self.max_fields = max_fields
+        self.fields = OrderedDict()
+        self.field_doors = {}
+        self.region_labels = {}
+        self.table = None
+        self.table_doors = None
+        self.door_array = self.house.doors.copy()
+        self.doors = None
+        sim.subscribe(EventType.DOORS_SHIFTED, self.on_doors_shifted)
+
+    def cell_id(self, cell):
+        return cell[0] * self.size + cell[1]
+
+    def cell_at(self, cell_id):
+        return divmod(cell_id, self.size)
+
+    def neighbors(self, cell_id):
+        doors = self.doors[cell_id]
+        if doors & 1:
+            yield cell_id - 1
+        if doors & 2:
+            yield cell_id + 1
+        if doors & 4:
+            yield cell_id + self.size
+        if doors & 8:
+            yield cell_id - self.size
+
+    def neighbor_table(self):
+        # Rooms behind each cell's four doors, or the sentinel cell n when closed
+        if self.table_doors is not self.door_array:
+            doors = self.door_array.ravel()
+            n = doors.size
+            cells = np.arange(n, dtype=np.int32)
+            self.table = np.full((n, 4), n, dtype=np.int32)
+            for i, (bit, step) in enumerate(((1, -1), (2, 1), (4, self.size), (8, -self.size))):
+                has_door = (doors & bit) != 0
+                self.table[has_door, i] = cells[has_door] + step
+            self.table_doors = self.door_array
+        return self.table
+
+    def bfs(self, source):
+        # Level-synchronous BFS, one vectorized step per distance ring
+        table = self.neighbor_table()
+        n = len(table)
+        dist = np.full(n + 1, PATH_UNREACHED, dtype=np.int32)
+        dist[n] = 0
+        dist[source] = 0
+        slot = np.empty(n + 1, dtype=np.int32)
+        frontier = np.array([source], dtype=np.int32)
+        level = 0
+        while frontier.size:
+            level += 1
+            found = table[frontier].ravel()
+            found = found[dist[found] == PATH_UNREACHED]
+            # Keep one copy of rooms reached through several doors
+            order = np.arange(found.size, dtype=np.int32)
+            slot[found] = order
+            frontier = found[slot[found] == order]
+            dist[frontier] = level
+        return dist[:n]
+
+    def sync_doors(self):
+        if self.doors is None:
+            self.doors = self.door_array.ravel().tolist()
+
+    def field(self, source):
+        self.sync_doors()
+        source = self.cell_id(source)
+        dist = self.fields.get(source)
+        if dist is None:
+            dist = self.fields[source] = self.bfs(source)
+            if len(self.fields) > self.max_fields:
+                del self.field_doors[self.fields.popitem(last=False)[0]]
+        else:
+            self.fields.move_to_end(source)
+            if self.field_doors[source] is not self.door_array:
+                dist = self.fields[source] = self.refresh(source, dist, self.field_doors[source])
+        self.field_doors[source] = self.door_array
+        return dist
+
+    def refresh(self, source, dist, doors):
+        # Bring a field computed against older doors up to date
+        old, new = doors.ravel(), self.door_array.ravel()
+        changed = np.flatnonzero(old != new)
+        # A closed door can orphan a large subtree, so repair only pays off
+        # for a handful of changes; the BFS cost grows with the house side
+        if len(changed) > self.size * PATH_REPAIR_PER_SIDE:
+            return self.bfs(source)
+        opened, closed = [], []
+        # Each edge is owned by its west/north cell's east/south bit
+        for bit, step in ((2, 1), (4, self.size)):
+            flipped = changed[((old[changed] ^ new[changed]) & bit) != 0]
+            is_open = (new[flipped] & bit) != 0
+            opened.extend(zip(flipped[is_open].tolist(), (flipped[is_open] + step).tolist()))
+            closed.extend(zip(flipped[~is_open].tolist(), (flipped[~is_open] + step).tolist()))
+        # The repair walks are scalar, which plain lists do much faster
+        dist = dist.tolist()
+        self.repair(dist, opened, closed)
+        return np.array(dist, dtype=np.int32)
+
+    def reachable(self, a, b):
+        return True
+
+    def distance(self, a, b):
+        if self.cell_id(a) in self.fields and self.cell_id(b) not in self.fields:
+            a, b = b, a
+        return int(self.field(b)[self.cell_id(a)])
+
+    def path(self, a, b):
+        dist = self.field(b)
+        cell = self.cell_id(a)
+        path = [a]
+        while dist[cell]:
+            cell = next(n for n in self.neighbors(cell) if dist[n] == dist[cell] - 1)
+            path.append(self.cell_at(cell))
+        return path
+
+    def next_step(self, a, b):
+        dist = self.field(b)
+        cell = self.cell_id(a)
+        for dir_name, bit in DOOR_BITS.items():
+            if self.doors[cell] & bit:
+                dx, dy = DIRECTIONS[dir_name]
+                if dist[cell + dx * self.size + dy] == dist[cell] - 1:
+                    return dir_name
+        return None
+
+    def reachable_in_region(self, region, cell):
+        # Rooms of a region reachable from cell without leaving the region
+        self.sync_doors()
+        labels = self.region_labels.get(region)
+        if labels is None:
+            labels = self.label_region(region)
+            self.region_labels[region] = labels
+        label = labels.get(self.cell_id(cell))
+        return {self.cell_at(c) for c, other in labels.items() if other == label} if label is not None else set()
+
+    def label_region(self, region):
+        regions = self.house.regions.ravel()
+        labels = {}
+        for start in np.flatnonzero(regions == region).tolist():
+            if start in labels:
+                continue
+            labels[start] = start
+            frontier = [start]
+            while frontier:
+                cell = frontier.pop()
+                for neighbor in self.neighbors(cell):
+                    if neighbor not in labels and regions[neighbor] == region:
+                        labels[neighbor] = start
+                        frontier.append(neighbor)
+        return labels
+
+    def on_doors_shifted(self, payload):
+        self.door_array = self.house.doors.copy()
+        self.doors = None
+        self.region_labels.clear()
+
+    def repair(self, dist, opened, closed):
+        # Closed doors: find rooms that lost every neighbour one step closer
+        # to the source, in order of distance, and recompute only those.
+        heap = []
+        for a, b in closed:
+            if dist[a] != dist[b]:
+                far = a if dist[a] > dist[b] else b
+                heapq.heappush(heap, (dist[far], far))
+        affected = set()
+        while heap:
+            d, cell = heapq.heappop(heap)
+            if cell in affected or d != dist[cell] or d == 0:
+                continue
+            if any(dist[n] == d - 1 and n not in affected for n in self.neighbors(cell)):
+                continue
+            affected.add(cell)
+            for n in self.neighbors(cell):
+                if dist[n] == d + 1:
+                    heapq.heappush(heap, (d + 1, n))
+        if affected:
+            for cell in affected:
+                dist[cell] = PATH_UNREACHED
+            heap = []
+            for cell in affected:
+                best = min((dist[n] + 1 for n in self.neighbors(cell) if n not in affected), default=PATH_UNREACHED)
+                if best < PATH_UNREACHED:
+                    dist[cell] = best
+                    heap.append((best, cell))
+            heapq.heapify(heap)
+            while heap:
+                d, cell = heapq.heappop(heap)
+                if d != dist[cell]:
+                    continue
+                for n in self.neighbors(cell):
+                    if dist[n] > d + 1:
+                        dist[n] = d + 1
+                        heapq.heappush(heap, (d + 1, n))
+
+        # Opened doors can only shorten distances; relax outwards from them
+        frontier = deque()
+        for a, b in opened:
+            for u, v in ((a, b), (b, a)):
+                if dist[u] + 1 < dist[v]:
+                    dist[v] = dist[u] + 1
+                    frontier.append(v)
+        while frontier:
+            cell = frontier.popleft()
+            next_dist = dist[cell] + 1
+            for n in self.neighbors(cell):
+                if dist[n] > next_dist:
+                    dist[n] = next_dist
+                    frontier.append(n)
+
+class StoryManager:
+    def __init__(self, sim, place=True):
+        self.sim = sim
+        self.house = sim.house
+        self.player = sim.player
+        self.story_items = [
+            Item("Broken Mirror", "Reflections show more than reality. Find where I shattered my image."),
+            Item("Faded Photograph", "A family torn apart. Seek the room where memories burned."),
+            Item("Locked Diary", "Secrets locked away. The key lies in the shadow of betrayal."),
+            Item("Torn Letter", "Words unsent, promises broken. Mend me in the place of silence."),
+            Item("Ancient Pendant", "A bond eternal, now cursed. Return me to the heart of despair.")
+        ]
+        self.clues = [
+            "The mirror broke in the attic, where the eldest took her life.",
+            "The fire consumed the study, destroying the family's legacy.",
+            "The diary's key is hidden in the basement, where trust was broken.",
+            "The letter was torn in the silent dining room, where arguments echoed.",
+            "The pendant was lost in the master bedroom, where love turned to hate."
+        ]
+        self.spirits_helped = [False] * len(self.story_items)
+        self.spirit_locations = [None] * len(self.story_items)
+        self.spirits_by_cell = {}
+        self.spirits_remaining = len(self.story_items)
+        self.region_spirits_remaining = [0] * NUM_REGIONS
+        if place:
+            self.place_items_and_spirits()
+        sim.subscribe(EventType.PLAYER_MOVED, self.on_player_moved)
+        sim.subscribe(EventType.ITEM_PICKED_UP, self.on_item_picked_up)
+
+    def spirit_region(self, spirit):
+        return spirit % NUM_REGIONS
+
+    def place_items_and_spirits(self):
+        for i, item in enumerate(self.story_items):
+            region = self.spirit_region(i)
+            cells = self.house.region_cells(region)
+            item_index = self.sim.rng.randrange(len(cells))
+            spirit_index = self.sim.rng.randrange(len(cells) - 1)
+            if spirit_index >= item_index:
+                spirit_index += 1
+            self.house.add_item(*cells[item_index].tolist(), item)
+            spirit_x, spirit_y = cells[spirit_index].tolist()
+            self.house.clues[(spirit_x, spirit_y)] = self.clues[i]
+            self.spirit_locations[i] = (spirit_x, spirit_y)
+            self.spirits_by_cell.setdefault((spirit_x, spirit_y), []).append(i)
+            self.region_spirits_remaining[region] += 1
+
+    def restore(self, spirit_locations, spirits_helped):
+        for i, (x, y) in enumerate(spirit_locations):
+            self.spirit_locations[i] = (x, y)
+            self.spirits_by_cell.setdefault((x, y), []).append(i)
+            self.spirits_helped[i] = spirits_helped[i]
+            if not spirits_helped[i]:
+                self.region_spirits_remaining[self.spirit_region(i)] += 1
+        self.spirits_remaining = self.spirits_helped.count(False)
+
+    def item_named(self, name):
+        return next(item for item in self.story_items if item.name == name)
+
+    def on_player_moved(self, cell):
+        for i in self.spirits_by_cell.get(cell, ()):
+            if self.spirits_helped[i]:
+                continue
+            if not self.resolve_spirit(i) and not self.player.hiding:
+                self.sim.say(self.clues[i])
+
+    def on_item_picked_up(self, item):
+        for i in self.spirits_by_cell.get((self.player.x, self.player.y), ()):
+            if not self.spirits_helped[i]:
+                self.resolve_spirit(i)
+
+    def resolve_spirit(self, spirit):
+        item_name = self.story_items[spirit].name
+        if item_name not in self.player.inventory:
+            return False
+        self.player.inventory.remove(item_name)
+        self.spirits_helped[spirit] = True
+        self.spirits_remaining -= 1
+        region = self.spirit_region(spirit)
+        self.region_spirits_remaining[region] -= 1
+        if not self.region_spirits_remaining[region]:
+            self.house.stabilized_regions[region] = True
+            self.sim.emit(EventType.REGION_STABILIZED, region)
+        self.sim.say(f"You've resolved the spirit's unrest in region {region}. The area stabilizes.")
+        self.sim.play('item_pickup')
+        return True
+
+    def all_spirits_helped(self):
+        return self.spirits_remaining == 0
+
+class Simulation:
+    def __init__(self, seed=None, size=GRID_SIZE, maze=None, endless=False, snapshot=None, tuning=None):
+        if snapshot is not None:
+            self.restore(*snapshot)
+            return
+        self.tuning = tuning if tuning is not None else Tuning()
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.np_rng = np.random.default_rng(self.seed)
+        self.size = size
+        self.maze = maze or default_maze(CHUNK_SIZE if endless else size)
+        self.endless = endless
+        self.tick = 0
+        self.state = GameState.PLAYING
+        self.message = ""
+        self.message_timer = 0
+        self.entities_near = False
+        self.events = []
+        self.listeners = {}
+        self.profiler = NullProfiler()
+        self.player = Player(self)
+        self.house = ChunkedHouse(self, self.maze, size) if endless else House(size, self, self.maze)
+        self.story = StoryManager(self)
+        self.paths = None if endless else PathService(self)
+        self.pursuit = Pursuit(self)
+
+    def restore(self, header, arrays):
+        self.tuning = Tuning(**header['tuning'])
+        self.seed = header['seed']
+        self.rng = random.Random()
+        self.np_rng = np.random.default_rng()
+        self.size = arrays['doors'].shape[0]
+        self.maze = header['maze']
+        self.endless = False
+        self.tick = header['tick']
+        self.state = GameState[header['state']]
+        self.message = header['message']
+        self.message_timer = header['message_timer']
+        self.entities_near = False
+        self.events = []
+        self.listeners = {}
+        self.profiler = NullProfiler()
+        self.player = Player(self)
+        self.house = House.from_arrays(self, arrays, last_shift=header['last_shift'])
+        self.story = StoryManager(self, place=False)
+        self.story.restore(header['spirit_locations'], header['spirits_helped'])
+        for x, y, name in header['items']:
+            self.house.add_item(x, y, self.story.item_named(name))
+        self.house.clues = {(x, y): clue for x, y, clue in header['clues']}
+        player = header['player']
+        for name in ('x', 'y', 'sanity', 'hiding', 'flashlight_on', 'flashlight_battery', 'last_battery_recharge'):
+            setattr(self.player, name, player[name])
+        for name in player['inventory']:
+            self.player.inventory.add(self.story.item_named(name))
+        self.rng.setstate((header['rng_version'], tuple(arrays['rng_state'].tolist()), header['rng_gauss']))
+        self.np_rng.bit_generator.state = header['np_rng_state']
+        self.paths = PathService(self)
+        self.pursuit = Pursuit(self)
+
+    def snapshot(self):
+        if self.house.size is None:
+            raise ValueError("Snapshots are not supported for the endless house")
+        house, player, story = self.house, self.player, self.story
+        rng_version, rng_state, rng_gauss = self.rng.getstate()
+        header = {
+            'seed': self.seed,
+            'maze': self.maze,
+            'tuning': self.tuning.as_dict(),
+            'tick': self.tick,
+            'state': self.state.name,
+            'message': self.message,
+            'message_timer': self.message_timer,
+            'last_shift': house.last_shift,
+            'player': {
+                'x': player.x,
+                'y': player.y,
+                'sanity': player.sanity,
+                'hiding': player.hiding,
+                'flashlight_on': player.flashlight_on,
+                'flashlight_battery': player.flashlight_battery,
+                'last_battery_recharge': player.last_battery_recharge,
+                'inventory': list(player.inventory.names)
+            },
+            'items': [[x, y, item.name] for (x, y), items in house.items.items() for item in items],
+            'clues': [[x, y, clue] for (x, y), clue in house.clues.items()],
+            'spirit_locations': story.spirit_locations,
+            'spirits_helped': story.spirits_helped,
+            'rng_version': rng_version,
+            'rng_gauss': rng_gauss,
+            'np_rng_state': self.np_rng.bit_generator.state
+        }
+        arrays = {
+            'doors': house.doors,
+            'spanning_tree': house.spanning_tree,
+            'regions': house.regions,
+            'descriptions': house.descriptions,
+            'entities': house.entities,
+            'stabilized_regions': house.stabilized_regions,
+            'last_tick': house.scheduler.last_tick,
+            'rng_state': np.array(rng_state, dtype=np.uint32)
+        }
+        return header, arrays
+
+    def state_hash(self):
+        player, house = self.player, self.house
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr((self.tick, self.state.name, player.x, player.y, player.sanity, player.hiding,
+                            player.flashlight_on, player.flashlight_battery, player.inventory.names,
+                            self.story.spirits_helped)).encode('utf-8'))
+        if house.size is None:
+            for key in sorted(house.chunks):
+                chunk = house.chunks[key]
+                digest.update(repr(key).encode('utf-8'))
+                digest.update(chunk.doors.tobytes())
+                digest.update(chunk.entities.tobytes())
+        else:
+            digest.update(house.doors.tobytes())
+            digest.update(house.entities.tobytes())
+        digest.update(house.stabilized_regions.tobytes())
+        return int.from_bytes(digest.digest(), 'little')
+
+    def subscribe(self, event_type, callback):
+        self.listeners.setdefault(event_type, []).append(callback)
+
+    def emit(self, event_type, payload=None):
+        self.events.append((event_type, payload))
+        for callback in self.listeners.get(event_type, ()):
+            callback(payload)
+
+    def say(self, text):
+        self.message = text
+        self.message_timer = 0
+        self.emit(EventType.MESSAGE, text)
+
+    def play(self, sound_name):
+        self.emit(EventType.SOUND, sound_name)
+
+    def act(self, action):
+        if self.state != GameState.PLAYING:
+            return
+        if action in DIRECTIONS:
+            self.player.move(action)
+        elif action == 'interact':
+            self.player.interact()
+        elif action == 'flashlight':
+            self.player.toggle_flashlight()
+        elif action == 'hide':
+            self.player.toggle_hiding()
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+    def step(self, n=1):
+        for _ in range(n):
+            if self.state != GameState.PLAYING:
+                break
+            self.update()
+        events, self.events = self.events, []
+        return events
+
+    def update(self):
+        self.tick += 1
+        self.player.update()
+        self.profiler.mark('player')
+        self.house.update()
+        self.profiler.mark('house')
+        self.pursuit.update()
+        self.profiler.mark('pursuit')
+        self.entities_near = self.house.entity_index.any_within(self.player.x, self.player.y, 2)
+
+        if self.player.sanity <= 0:
+            self.say("The shadows have claimed your mind. You are lost forever.")
+            self.state = GameState.GAME_OVER
+        elif self.story.all_spirits_helped():
+            self.say("All spirits are at peace. The house releases its grip. You escape.")
+            self.state = GameState.VICTORY
+
+        if self.message:
+            self.message_timer += 1
+            if self.message_timer > MESSAGE_TICKS:
+                self.message = ""
+                self.message_timer = 0
+        self.profiler.mark('story')
+
+# Snapshots: magic, version and header length, a JSON header describing the
+# scalar state and array layout, then each array's raw bytes aligned to
+# SNAPSHOT_ALIGN so loading can view them straight out of a memory map.
+def align(offset):
+    return -(-offset // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+def save_snapshot(sim, path=SNAPSHOT_FILE):
+    header, arrays = sim.snapshot()
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = [offset, array.dtype.str, list(array.shape)]
+        offset = align(offset + array.nbytes)
+    header['arrays'] = layout
+    meta = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    prefix = struct.pack(SNAPSHOT_PREFIX, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(meta))
+    data_start = align(len(prefix) + len(meta))
+    # Write a new file and swap it in, so a failed save never leaves a
+    # half-written snapshot and a tool still mapping the old one keeps it
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(prefix)
+            f.write(meta)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name][0])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return data_start + offset
+
+def load_snapshot(path=SNAPSHOT_FILE, copy=False):
+    # Copy-on-write map: pages are read lazily and edits never reach the file.
+    # copy=True reads the arrays out and drops the map, which the game needs
+    # to save over the same path later (Windows cannot replace a mapped file).
+    data = np.memmap(path, dtype=np.uint8, mode='c')
+    prefix_len = struct.calcsize(SNAPSHOT_PREFIX)
+    if data.size < prefix_len:
+        raise ValueError(f"{path} is truncated")
+    magic, version, meta_len = struct.unpack_from(SNAPSHOT_PREFIX, data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not an Echoes snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    if data.size < prefix_len + meta_len:
+        raise ValueError(f"{path} is truncated")
+    header = json.loads(bytes(data[prefix_len:prefix_len + meta_len]).decode('utf-8'))
+    data_start = align(prefix_len + meta_len)
+    arrays = {}
+    for name, (offset, dtype, shape) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        start = data_start + offset
+        end = start + int(np.prod(shape)) * dtype.itemsize
+        if end > data.size:
+            raise ValueError(f"{path} is truncated")
+        arrays[name] = data[start:end].view(dtype).reshape(shape)
+        if copy:
+            arrays[name] = np.array(arrays[name])
+    return Simulation(snapshot=(header, arrays))
+
+def measure_snapshots(sizes=(12, 64, 256, 1000), seed=0):
+    # Work in a scratch directory so the player's own save is left alone
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, SNAPSHOT_FILE)
+        for size in sizes:
+            sim = Simulation(seed, size=size)
+            start = time.perf_counter()
+            nbytes = save_snapshot(sim, path)
+            saved = time.perf_counter()
+            load_snapshot(path)
+            loaded = time.perf_counter()
+            check_snapshot_round_trip(path)
+            results.append((size, nbytes, saved - start, loaded - saved))
+            print(f"{size}x{size}: {nbytes / 1024:.1f} KiB, save {(saved - start) * 1000:.1f} ms, "
+                  f"load {(loaded - saved) * 1000:.1f} ms, round trip ok")
+    return results
+
+def check_snapshot_round_trip(path=SNAPSHOT_FILE, ticks=SNAPSHOT_CHECK_TICKS):
+    # Load like the game does, play on, save over the same file, and check
+    # neither the running game nor the reloaded one changed
+    def state(sim):
+        header, arrays = sim.snapshot()
+        return header, {name: np.array(array) for name, array in arrays.items()}
+
+    def same(a, b):
+        return a[0] == b[0] and all(np.array_equal(a[1][name], b[1][name]) for name in a[1])
+
+    sim = load_snapshot(path, copy=True)
+    for _ in range(ticks):
+        sim.update()
+        sim.events.clear()
+    expected = state(sim)
+    save_snapshot(sim, path)
+    if not same(state(sim), expected):
+        raise ValueError("Saving a snapshot changed the running game")
+    if not same(state(load_snapshot(path)), expected):
+        raise ValueError("A reloaded snapshot differs from the saved game")
+
+# Input logs: a header with the simulation's seed, shape and Tuning values in
+# slot order, then one record per input or checkpoint. Each record is the tick
+# delta as a varint and a code byte: an index into ACTIONS, or
+# LOG_CHECKPOINT/LOG_END followed by the 8-byte state hash at that tick.
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+class InputRecorder:
+    def __init__(self, sim):
+        self.sim = sim
+        self.data = bytearray(struct.pack(INPUT_LOG_HEADER, INPUT_LOG_MAGIC, INPUT_LOG_VERSION, sim.seed,
+                                          0 if sim.endless else sim.size, list(MAZE_GENERATORS).index(sim.maze),
+                                          sim.endless, *sim.tuning.as_dict().values()))
+        self.last_tick = sim.tick
+        self.last_checkpoint = sim.tick
+
+    def write(self, code):
+        write_varint(self.data, self.sim.tick - self.last_tick)
+        self.data.append(code)
+        self.last_tick = self.sim.tick
+
+    def record(self, action):
+        self.write(ACTIONS.index(action))
+
+    def update(self):
+        if self.sim.tick % CHECKPOINT_TICKS == 0 and self.sim.tick != self.last_checkpoint:
+            self.write(LOG_CHECKPOINT)
+            self.data += struct.pack('<Q', self.sim.state_hash())
+            self.last_checkpoint = self.sim.tick
+
+    def save(self, path):
+        self.write(LOG_END)
+        self.data += struct.pack('<Q', self.sim.state_hash())
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+def read_input_log(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < struct.calcsize(INPUT_LOG_HEADER):
+        raise ValueError(f"{path} is truncated")
+    magic, version, seed, size, maze, endless, *tuning = struct.unpack_from(INPUT_LOG_HEADER, data)
+    if magic != INPUT_LOG_MAGIC:
+        raise ValueError(f"{path} is not an Echoes input log")
+    if version != INPUT_LOG_VERSION:
+        raise ValueError(f"Unsupported input log version {version}")
+    header = {'seed': seed, 'size': size or GRID_SIZE, 'maze': list(MAZE_GENERATORS)[maze], 'endless': bool(endless),
+              'tuning': dict(zip(Tuning.__slots__, tuning))}
+    records = []
+    pos = struct.calcsize(INPUT_LOG_HEADER)
+    tick = 0
+    try:
+        while pos < len(data):
+            delta, pos = read_varint(data, pos)
+            tick += delta
+            code = data[pos]
+            pos += 1
+            if code in (LOG_CHECKPOINT, LOG_END):
+                records.append((tick, code, struct.unpack_from('<Q', data, pos)[0]))
+                pos += 8
+            else:
+                records.append((tick, code, ACTIONS[code]))
+    except (IndexError, struct.error):
+        raise ValueError(f"{path} is truncated or corrupt") from None
+    return header, records
+
+def replay_input_log(path, verify=True):
+    header, records = read_input_log(path)
+    sim = Simulation(header['seed'], size=header['size'], maze=header['maze'], endless=header['endless'],
+                     tuning=Tuning(**header['tuning']))
+    start = time.perf_counter()
+    checked = 0
+    for tick, code, value in records:
+        while sim.tick < tick and sim.state == GameState.PLAYING:
+            sim.update()
+        sim.events.clear()
+        if code not in (LOG_CHECKPOINT, LOG_END):
+            sim.act(value)
+        elif verify:
+            if sim.state_hash() != value:
+                raise ValueError(f"Replay diverged from the recording at tick {tick}")
+            checked += 1
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {sim.tick} ticks in {elapsed * 1000:.1f} ms "
+          f"({sim.tick / max(elapsed, 1e-9):.0f} ticks/s), {checked} checkpoints verified")
+    return sim, elapsed
+
+if __name__ == "__main__":
+    if '--snapshot-bench' in sys.argv:
+        measure_snapshots()
+        sys.exit()
+    if '--maze-bench' in sys.argv:
+        measure_maze_generators()
+        sys.exit()
+    if '--replay' in sys.argv:
+        replay_input_log(sys.argv[sys.argv.index('--replay') + 1])
+        sys.exit()
+    record = sys.argv[sys.argv.index('--record') + 1] if '--record' in sys.argv else None
+    game = Game(endless='--endless' in sys.argv, audio='--mute' not in sys.argv,
+                show_timings='--timings' in sys.argv, record=record)
+    game.run()
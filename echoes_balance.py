@@ -0,0 +1,130 @@
+import argparse
+import csv
+import itertools
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import Echoes_Game_V1 as echoes
+
+AGENT_MOVE_TICKS = 10
+FLASHLIGHT_RESERVE = 10
+SANITY_SAMPLE_TICKS = 5 * echoes.TICK_RATE
+MAX_GAME_SECONDS = 300
+PARAMETERS = ('sanity_drain_rate', 'entity_spawn_chance', 'flashlight_drain_rate', 'extra_door_chance')
+
+class ScriptedAgent:
+    # Walks to the next unresolved spirit's item, then to the spirit, taking
+    # the shortest route through the current doors. The flashlight goes on
+    # when shadows are close and off again to save the battery.
+    def __init__(self, sim):
+        self.sim = sim
+        self.next_move = 0
+
+    def item_location(self, name):
+        for cell, items in self.sim.house.items.items():
+            if any(item.name == name for item in items):
+                return cell
+        return None
+
+    def target(self):
+        story, player = self.sim.story, self.sim.player
+        for i, item in enumerate(story.story_items):
+            if story.spirits_helped[i]:
+                continue
+            if item.name in player.inventory:
+                return story.spirit_locations[i]
+            return self.item_location(item.name)
+        return None
+
+    def act(self):
+        sim, player = self.sim, self.sim.player
+        if player.flashlight_on != (sim.entities_near and player.flashlight_battery > FLASHLIGHT_RESERVE):
+            sim.act('flashlight')
+        if sim.tick < self.next_move:
+            return
+        self.next_move = sim.tick + AGENT_MOVE_TICKS
+        cell = (player.x, player.y)
+        if sim.house.items.get(cell):
+            sim.act('interact')
+            return
+        target = self.target()
+        if target is not None and target != cell:
+            sim.act(sim.paths.next_step(cell, target))
+
+def play(tuning, seed, size, max_ticks):
+    sim = echoes.Simulation(seed, size=size, tuning=echoes.Tuning(**tuning))
+    agent = ScriptedAgent(sim)
+    sanity = []
+    while sim.state == echoes.GameState.PLAYING and sim.tick < max_ticks:
+        agent.act()
+        sim.update()
+        sim.events.clear()
+        if sim.tick % SANITY_SAMPLE_TICKS == 0:
+            sanity.append(sim.player.sanity)
+    return sim.state == echoes.GameState.VICTORY, sim.tick, sanity
+
+def play_batch(task):
+    tuning, seeds, size, max_ticks = task
+    return tuning, [play(tuning, seed, size, max_ticks) for seed in seeds]
+
+def summarize(tuning, results, samples):
+    wins = [ticks for won, ticks, _ in results if won]
+    row = dict(tuning)
+    row['games'] = len(results)
+    row['win_rate'] = len(wins) / len(results)
+    row['mean_victory_s'] = round(statistics.mean(wins) / echoes.TICK_RATE, 2) if wins else ''
+    row['median_victory_s'] = round(statistics.median(wins) / echoes.TICK_RATE, 2) if wins else ''
+    # Mean sanity of the games still running at each sample time
+    for i in range(samples):
+        alive = [curve[i] for _, _, curve in results if len(curve) > i]
+        row[f'sanity_{(i + 1) * SANITY_SAMPLE_TICKS // echoes.TICK_RATE}s'] = round(statistics.mean(alive), 2) if alive else ''
+    return row
+
+def parse_values(text):
+    return [float(value) for value in text.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balance runner for Echoes of the Forgotten")
+    parser.add_argument('--sanity-drain', type=parse_values, default=[echoes.SANITY_DRAIN_RATE])
+    parser.add_argument('--spawn-chance', type=parse_values, default=[echoes.ENTITY_SPAWN_CHANCE])
+    parser.add_argument('--flashlight-drain', type=parse_values, default=[echoes.FLASHLIGHT_DRAIN_RATE])
+    parser.add_argument('--extra-doors', type=parse_values, default=[echoes.EXTRA_DOOR_CHANCE])
+    parser.add_argument('--games', type=int, default=100, help="games per parameter set")
+    parser.add_argument('--size', type=int, default=echoes.GRID_SIZE)
+    parser.add_argument('--max-seconds', type=int, default=MAX_GAME_SECONDS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch', type=int, default=10, help="games per worker task")
+    parser.add_argument('--out', default='balance.csv')
+    args = parser.parse_args(argv)
+
+    grid = [dict(zip(PARAMETERS, values)) for values in
+            itertools.product(args.sanity_drain, args.spawn_chance, args.flashlight_drain, args.extra_doors)]
+    max_ticks = args.max_seconds * echoes.TICK_RATE
+    tasks = [(tuning, range(start, min(start + args.batch, args.games)), args.size, max_ticks)
+             for tuning in grid for start in range(0, args.games, args.batch)]
+
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for tuning, batch in pool.map(play_batch, tasks):
+            results.setdefault(tuple(tuning.values()), []).extend(batch)
+    elapsed = time.perf_counter() - start
+
+    samples = max(len(curve) for games in results.values() for _, _, curve in games)
+    rows = [summarize(dict(zip(PARAMETERS, key)), games, samples) for key, games in results.items()]
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    total = len(grid) * args.games
+    print(f"{total} games over {len(grid)} parameter sets in {elapsed:.1f} s "
+          f"({total / elapsed:.1f} games/s on {args.workers} workers), written to {args.out}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import Echoes_Game_V1 as echoes
+
+SIZES = (12, 64, 256, 1000)
+QUICK_SIZES = (12, 64, 256)
+SEED = 1
+MIN_RUN_SECONDS = 0.2
+REPEATS = 7
+BASELINE_FILE = 'echoes_bench_baseline.json'
+TOLERANCE = 0.25
+
+# Each case is a setup function returning the callable to time, so that
+# building houses or opening the display is never part of a measurement.
+def generator_case(maze, size):
+    def setup():
+        return lambda: echoes.MAZE_GENERATORS[maze](size, random.Random(SEED), np.random.default_rng(SEED))
+    return setup
+
+def house_case(size):
+    def setup():
+        sim = echoes.Simulation(SEED, size=12)
+        return lambda: echoes.House(size, sim)
+    return setup
+
+def house_update_case(size, shift):
+    def setup():
+        sim = echoes.Simulation(SEED, size=size)
+        house = sim.house
+
+        def run():
+            sim.tick += 1
+            house.last_shift = sim.tick - echoes.DOOR_SHIFT_TICKS if shift else sim.tick
+            house.update()
+            sim.events.clear()
+        return run
+    return setup
+
+def story_case(size):
+    def setup():
+        sim = echoes.Simulation(SEED, size=size)
+        cells = list(sim.story.spirit_locations)
+
+        def run():
+            # Entering a spirit's room without its item shows the clue
+            for cell in cells:
+                sim.emit(echoes.EventType.PLAYER_MOVED, cell)
+                sim.emit(echoes.EventType.ITEM_PICKED_UP, None)
+            sim.events.clear()
+        return run
+    return setup
+
+def draw_case(full):
+    def setup():
+        game = echoes.Game(SEED, audio=False)
+        game.draw()
+
+        def run():
+            if full:
+                game.renderer.keys = {}
+                game.renderer.minimap_dirty = True
+            game.draw()
+        return run
+    return setup
+
+def build_cases(sizes):
+    cases = []
+    for size in sizes:
+        for maze in echoes.MAZE_GENERATORS:
+            cases.append((f"generate/{maze}/{size}", generator_case(maze, size)))
+        cases.append((f"house/{size}", house_case(size)))
+        cases.append((f"house_update/{size}", house_update_case(size, False)))
+        cases.append((f"house_update_shift/{size}", house_update_case(size, True)))
+        cases.append((f"story_events/{size}", story_case(size)))
+    cases.append(("draw/steady", draw_case(False)))
+    cases.append(("draw/full", draw_case(True)))
+    return cases
+
+def measure(setup):
+    run = setup()
+    # Calibrate like timeit: grow the loop count until one repeat is long enough
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - start >= MIN_RUN_SECONDS:
+            break
+        number *= 2
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        times = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            times.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'median_seconds': statistics.median(times), 'peak_bytes': peak}
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for Echoes of the Forgotten")
+    parser.add_argument('--quick', action='store_true', help=f"only sizes {QUICK_SIZES}")
+    parser.add_argument('--filter', default='', help="only cases whose name contains this text")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed slowdown before failing")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+
+    results = {}
+    regressions = []
+    print(f"{'case':<28} {'time':>12} {'peak':>10} {'baseline':>12}")
+    for name, setup in build_cases(QUICK_SIZES if args.quick else SIZES):
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(setup)
+        line = f"{name:<28} {format_time(result['seconds']):>12} {result['peak_bytes'] / 2 ** 20:>8.2f} MB"
+        if name in baseline:
+            ratio = result['seconds'] / baseline[name]['seconds']
+            line += f" {ratio:>11.2f}x"
+            if ratio > 1 + args.tolerance:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line, flush=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'numpy': np.__version__, 'cases': results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}: "
+              + ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import argparse
+import json
+import queue
+import random
+import socket
+import struct
+import sys
+import threading
+
+import pygame
+
+import Echoes_Game_V1 as echoes
+from echoes_server import (FRAME_HEADER, MSG_DELTA, MSG_ERROR, MSG_INPUT, MSG_JOIN, MSG_KEYFRAME, SERVER_HOST,
+                           SERVER_PORT, SessionMirror, encode_frame)
+
+def connect(host, port, unix):
+    if unix:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(unix)
+    else:
+        sock = socket.create_connection((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+def receive_frames(sock, frames):
+    # Blocking reader thread; the render loop drains the queue each frame
+    stream = sock.makefile('rb')
+    header_size = struct.calcsize(FRAME_HEADER)
+    try:
+        while True:
+            header = stream.read(header_size)
+            if len(header) < header_size:
+                break
+            length, kind = struct.unpack(FRAME_HEADER, header)
+            frames.put((kind, stream.read(length - 1)))
+    except OSError:
+        pass
+    frames.put((None, b''))
+
+class RemoteGame:
+    # Stands in for Game so the regular Renderer can draw the mirrored session
+    def __init__(self, sock, frames):
+        pygame.init()
+        self.screen = pygame.display.set_mode((echoes.SCREEN_WIDTH, echoes.SCREEN_HEIGHT))
+        pygame.display.set_caption("Echoes of the Forgotten")
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.Font(None, 36)
+        self.small_font = pygame.font.Font(None, 24)
+        self.profiler = echoes.NullProfiler()
+        self.show_profile = False
+        self.sock = sock
+        self.frames = frames
+        self.sim = self.house = SessionMirror()
+        self.player = self.sim.player
+        self.state = echoes.GameState.PLAYING
+        self.distortion_alpha = 0
+        self.renderer = None
+        self.connected = True
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.connected = False
+            elif event.type == pygame.KEYDOWN and event.key in echoes.KEY_ACTIONS:
+                action = echoes.ACTIONS.index(echoes.KEY_ACTIONS[event.key])
+                self.sock.sendall(encode_frame(MSG_INPUT, bytes([action])))
+
+    def update(self):
+        while True:
+            try:
+                kind, payload = self.frames.get_nowait()
+            except queue.Empty:
+                break
+            if kind == MSG_KEYFRAME:
+                self.sim.apply_keyframe(payload)
+                self.renderer = echoes.Renderer(self)
+                print(f"Joined session {self.sim.session_id}")
+            elif kind == MSG_DELTA:
+                # Raise the renderer events a local game would have emitted
+                x, y = self.player.x, self.player.y
+                stabilized = self.sim.stabilized_regions
+                if self.sim.apply_delta(payload):
+                    self.renderer.handle_event(echoes.EventType.DOORS_SHIFTED, None)
+                if (x, y) != (self.player.x, self.player.y):
+                    self.renderer.handle_event(echoes.EventType.PLAYER_MOVED, (self.player.x, self.player.y))
+                if (stabilized != self.sim.stabilized_regions).any():
+                    self.renderer.handle_event(echoes.EventType.REGION_STABILIZED, None)
+            elif kind == MSG_ERROR:
+                print(f"Server refused: {payload.decode('utf-8')}", file=sys.stderr)
+                self.connected = False
+            elif kind is None:
+                print("Disconnected from server", file=sys.stderr)
+                self.connected = False
+        self.state = self.sim.state
+        self.distortion_alpha = max(0, 255 - int(self.player.sanity * 2.55))
+        if self.player.sanity < echoes.SANITY_THRESHOLD_LOW:
+            self.distortion_alpha = min(255, self.distortion_alpha + random.randint(-20, 20))
+
+    def run(self):
+        while self.connected:
+            self.handle_events()
+            self.update()
+            if self.renderer is not None:
+                self.renderer.draw()
+            self.clock.tick(echoes.FPS)
+        pygame.quit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thin client for an Echoes session server")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--unix', help="connect over a Unix socket")
+    parser.add_argument('--session', type=int, help="join an existing session instead of starting one")
+    parser.add_argument('--spectate', action='store_true', help="watch without sending inputs")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--size', type=int, default=echoes.GRID_SIZE)
+    args = parser.parse_args(argv)
+    if args.spectate and args.session is None:
+        parser.error("--spectate needs --session")
+
+    sock = connect(args.host, args.port, args.unix)
+    request = {'session': args.session, 'role': 'spectator' if args.spectate else 'player',
+               'seed': args.seed, 'size': args.size}
+    sock.sendall(encode_frame(MSG_JOIN, json.dumps(request).encode('utf-8')))
+    frames = queue.Queue()
+    threading.Thread(target=receive_frames, args=(sock, frames), daemon=True).start()
+    RemoteGame(sock, frames).run()
+    sock.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
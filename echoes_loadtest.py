@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import Echoes_Game_V1 as echoes
+from echoes_server import (MSG_DELTA, MSG_INPUT, MSG_JOIN, MSG_KEYFRAME, MSG_STATS, MSG_STATS_REPLY, SessionMirror,
+                           encode_frame, read_frame)
+
+BOT_ACTION_TICKS = 15
+WARMUP_SECONDS = 2
+MEASURE_SECONDS = 5
+TICK_BUDGET = 0.8
+
+async def open_connection(address):
+    if address.startswith('unix:'):
+        return await asyncio.open_unix_connection(address[5:])
+    host, port = address.rsplit(':', 1)
+    return await asyncio.open_connection(host, int(port))
+
+async def join(address, request):
+    reader, writer = await open_connection(address)
+    writer.write(encode_frame(MSG_JOIN, json.dumps(request).encode('utf-8')))
+    return reader, writer
+
+async def bot(address, seed, intervals):
+    # Random walk through open doors with the odd flashlight toggle. When
+    # the game ends the bot starts a fresh session so the load stays constant.
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    while True:
+        reader, writer = await join(address, {'seed': seed})
+        mirror = SessionMirror()
+        last = None
+        try:
+            while mirror.state == echoes.GameState.PLAYING:
+                kind, payload = await read_frame(reader)
+                if kind == MSG_KEYFRAME:
+                    mirror.apply_keyframe(payload)
+                    continue
+                if kind != MSG_DELTA:
+                    continue
+                now = loop.time()
+                if last is not None:
+                    intervals.append(now - last)
+                last = now
+                mirror.apply_delta(payload)
+                if mirror.tick % BOT_ACTION_TICKS:
+                    continue
+                player = mirror.player
+                doors = mirror.doors[player.x, player.y]
+                choices = [name for name, bit in echoes.DOOR_BITS.items() if doors & bit]
+                action = 'flashlight' if rng.random() < 0.1 else rng.choice(choices)
+                writer.write(encode_frame(MSG_INPUT, bytes([echoes.ACTIONS.index(action)])))
+        finally:
+            writer.close()
+        seed += 1 << 20
+
+async def query_stats(reader, writer, reset):
+    writer.write(encode_frame(MSG_STATS, bytes([reset])))
+    while True:
+        kind, payload = await read_frame(reader)
+        if kind == MSG_STATS_REPLY:
+            return json.loads(payload)
+
+async def start_server(size):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'echoes_server.py')
+    process = await asyncio.create_subprocess_exec(sys.executable, script, '--port', '0', '--size', str(size),
+                                                   stdout=asyncio.subprocess.PIPE)
+    line = (await process.stdout.readline()).decode('utf-8').strip()
+    return process, line.rsplit(' ', 1)[-1]
+
+async def run(args):
+    process = None
+    address = args.connect
+    if address is None:
+        process, address = await start_server(args.size)
+    monitor = await join(address, {'role': 'monitor'})
+    bots = []
+    intervals = []
+    results = []
+    print(f"{'sessions':>8} {'tick p50':>9} {'tick p99':>9} {'tick max':>9} {'overruns':>8} {'delta p99':>10}")
+    try:
+        sessions = 1
+        while sessions <= args.max_sessions:
+            while len(bots) < sessions:
+                bots.append(asyncio.create_task(bot(address, len(bots), intervals)))
+            await asyncio.sleep(WARMUP_SECONDS)
+            await query_stats(*monitor, reset=1)
+            intervals.clear()
+            await asyncio.sleep(MEASURE_SECONDS)
+            stats = await query_stats(*monitor, reset=0)
+            delta_p99 = np.percentile(intervals, 99) * 1000 if intervals else float('nan')
+            results.append((sessions, stats))
+            print(f"{sessions:>8} {stats['tick_p50_ms']:>7.2f}ms {stats['tick_p99_ms']:>7.2f}ms "
+                  f"{stats['tick_max_ms']:>7.2f}ms {stats['overruns']:>8} {delta_p99:>8.2f}ms", flush=True)
+            if stats['tick_p99_ms'] > stats['tick_budget_ms'] * TICK_BUDGET:
+                break
+            sessions *= 2
+    finally:
+        for task in bots:
+            task.cancel()
+        await asyncio.gather(*bots, return_exceptions=True)
+        monitor[1].close()
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+    # The server ticks every session on one thread, so this is per core
+    within = [sessions for sessions, stats in results if stats['tick_p99_ms'] <= stats['tick_budget_ms'] * TICK_BUDGET]
+    if within and len(within) == len(results):
+        # Never went over budget, so the real limit is somewhere above the cap
+        print(f"Reached --max-sessions: {max(within)} sessions still ran with p99 tick time under "
+              f"{TICK_BUDGET:.0%} of the budget; raise --max-sessions to find the per-core limit")
+    elif within:
+        print(f"~{max(within)} sessions per core with p99 tick time under {TICK_BUDGET:.0%} of the budget")
+    else:
+        print("Even one session exceeds the tick budget")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for the Echoes session server")
+    parser.add_argument('--connect', help="host:port or unix:PATH of a running server; by default one is started")
+    parser.add_argument('--size', type=int, default=echoes.GRID_SIZE, help="house size for a started server")
+    parser.add_argument('--max-sessions', type=int, default=1024)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import Echoes_Game_V1 as echoes
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 7777
+MAX_CLIENT_BUFFER = 1 << 20
+MAX_FRAME = 1 << 26
+STATS_TICKS = 10 * echoes.TICK_RATE
+MIN_SESSION_SIZE = 4
+MAX_SESSION_SIZE = 256
+ROLES = ('player', 'spectator', 'monitor')
+
+# Frames are a little-endian uint32 length, a type byte and a payload.
+# Client to server: JOIN (JSON request with an optional session id, seed,
+# size and a role of player, spectator or monitor), INPUT (one ACTIONS
+# index), STATS (one byte, 1 to reset the window after replying).
+# Server to client: KEYFRAME once after joining, then one DELTA per tick.
+MSG_JOIN = 1
+MSG_INPUT = 2
+MSG_STATS = 3
+MSG_KEYFRAME = 16
+MSG_DELTA = 17
+MSG_STATS_REPLY = 18
+MSG_ERROR = 19
+
+FRAME_HEADER = '<IB'
+# tick, x, y, sanity, battery, flags, game state, stabilized regions bitmask
+DELTA_HEADER = '<IIIffBBB'
+FLAG_FLASHLIGHT = 1
+FLAG_HIDING = 2
+# Optional DELTA sections, each a uint16 length and UTF-8 JSON
+SECTION_MESSAGE = 1
+SECTION_INVENTORY = 2
+SECTION_ITEMS = 4
+KEYFRAME_ARRAYS = (('doors', np.uint8), ('entities', np.uint16), ('regions', np.uint8), ('descriptions', np.uint8))
+
+def encode_frame(kind, payload=b''):
+    return struct.pack(FRAME_HEADER, len(payload) + 1, kind) + payload
+
+async def read_frame(reader):
+    length, kind = struct.unpack(FRAME_HEADER, await reader.readexactly(struct.calcsize(FRAME_HEADER)))
+    if not 1 <= length <= MAX_FRAME:
+        raise ConnectionError(f"Bad frame length {length}")
+    return kind, await reader.readexactly(length - 1)
+
+def encode_json(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def item_list(house):
+    return [[x, y, item.name] for (x, y), items in house.items.items() for item in items]
+
+def is_int(value):
+    # JSON true/false arrive as bool, which isinstance() also counts as int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def stabilized_mask(house):
+    return sum(1 << region for region in np.flatnonzero(house.stabilized_regions).tolist())
+
+class Session:
+    # One authoritative simulation. After every tick it diffs the house
+    # against the copy it last sent and encodes only what changed.
+    def __init__(self, session_id, seed=None, size=echoes.GRID_SIZE):
+        self.session_id = session_id
+        self.sim = echoes.Simulation(seed, size=size)
+        self.clients = set()
+        self.inputs = []
+        house = self.sim.house
+        self.doors = house.doors.copy()
+        self.entities = house.entities.copy()
+        self.message = self.sim.message
+        self.inventory = self.sim.player.inventory.names
+        self.items = item_list(house)
+        self.finished = False
+
+    def keyframe(self):
+        sim, house = self.sim, self.sim.house
+        meta = encode_json({
+            'session': self.session_id,
+            'seed': sim.seed,
+            'size': house.size,
+            'message': sim.message,
+            'inventory': list(sim.player.inventory.names),
+            'items': self.items
+        })
+        arrays = b''.join(np.ascontiguousarray(getattr(house, name), dtype=dtype).tobytes()
+                          for name, dtype in KEYFRAME_ARRAYS)
+        return struct.pack('<I', len(meta)) + meta + self.delta_header() + arrays
+
+    def delta_header(self):
+        sim, player = self.sim, self.sim.player
+        flags = (FLAG_FLASHLIGHT if player.flashlight_on else 0) | (FLAG_HIDING if player.hiding else 0)
+        return struct.pack(DELTA_HEADER, sim.tick, player.x, player.y, player.sanity, player.flashlight_battery,
+                           flags, sim.state.value, stabilized_mask(sim.house))
+
+    def step(self):
+        sim = self.sim
+        for action in self.inputs:
+            sim.act(action)
+        self.inputs.clear()
+        shifted = any(event_type == echoes.EventType.DOORS_SHIFTED for event_type, _ in sim.step())
+        self.finished = sim.state != echoes.GameState.PLAYING
+        return self.delta(shifted)
+
+    def delta(self, shifted):
+        house, player = self.sim.house, self.sim.player
+        parts = [self.delta_header()]
+        # Doors only change on a shift; entities can change any tick
+        door_cells = np.flatnonzero(self.doors != house.doors) if shifted else np.zeros(0, dtype=np.intp)
+        entity_cells = np.flatnonzero(self.entities != house.entities)
+        for cells, current, previous, dtype in ((door_cells, house.doors, self.doors, np.uint8),
+                                                (entity_cells, house.entities, self.entities, np.uint16)):
+            values = current.ravel()[cells]
+            previous.ravel()[cells] = values
+            parts += [struct.pack('<I', len(cells)), cells.astype(np.uint32).tobytes(), values.astype(dtype).tobytes()]
+
+        sections = 0
+        extras = []
+        if self.sim.message != self.message:
+            self.message = self.sim.message
+            sections |= SECTION_MESSAGE
+            extras.append(encode_json(self.message))
+        if player.inventory.names != self.inventory:
+            self.inventory = player.inventory.names
+            sections |= SECTION_INVENTORY
+            extras.append(encode_json(list(self.inventory)))
+        if sum(len(items) for items in house.items.values()) != len(self.items):
+            self.items = item_list(house)
+            sections |= SECTION_ITEMS
+            extras.append(encode_json(self.items))
+        parts.append(struct.pack('<B', sections))
+        for extra in extras:
+            parts += [struct.pack('<H', len(extra)), extra]
+        return b''.join(parts)
+
+class RemoteInventory:
+    __slots__ = ('names',)
+
+    def __init__(self, names=()):
+        self.names = tuple(names)
+
+class RemotePlayer:
+    def __init__(self):
+        self.x = self.y = 0
+        self.sanity = 100
+        self.flashlight_battery = echoes.FLASHLIGHT_BATTERY_MAX
+        self.flashlight_on = False
+        self.hiding = False
+        self.inventory = RemoteInventory()
+
+class SessionMirror:
+    # Client-side copy of a session rebuilt from the stream. It quacks like
+    # the House and Simulation parts the Renderer reads.
+    def __init__(self):
+        self.session_id = None
+        self.size = 0
+        self.tick = 0
+        self.state = echoes.GameState.PLAYING
+        self.message = ""
+        self.player = RemotePlayer()
+        self.doors = self.entities = self.regions = self.descriptions = None
+        self.stabilized_regions = np.zeros(echoes.NUM_REGIONS, dtype=bool)
+        self.items = {}
+        self.clues = {}
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def get_room(self, x, y):
+        return echoes.Room(self, x, y)
+
+    def set_items(self, items):
+        self.items = {}
+        for x, y, name in items:
+            self.items.setdefault((x, y), []).append(name)
+
+    def apply_keyframe(self, payload):
+        meta_len = struct.unpack_from('<I', payload)[0]
+        meta = json.loads(payload[4:4 + meta_len])
+        self.session_id = meta['session']
+        self.size = meta['size']
+        self.message = meta['message']
+        self.player.inventory = RemoteInventory(meta['inventory'])
+        self.set_items(meta['items'])
+        pos = self.read_header(payload, 4 + meta_len)
+        for name, dtype in KEYFRAME_ARRAYS:
+            nbytes = self.size * self.size * np.dtype(dtype).itemsize
+            setattr(self, name, np.frombuffer(payload, dtype=dtype, count=self.size * self.size, offset=pos)
+                    .reshape(self.size, self.size).copy())
+            pos += nbytes
+
+    def read_header(self, payload, pos):
+        tick, x, y, sanity, battery, flags, state, stabilized = struct.unpack_from(DELTA_HEADER, payload, pos)
+        player = self.player
+        player.x, player.y, player.sanity, player.flashlight_battery = x, y, sanity, battery
+        player.flashlight_on = bool(flags & FLAG_FLASHLIGHT)
+        player.hiding = bool(flags & FLAG_HIDING)
+        self.tick = tick
+        self.state = echoes.GameState(state)
+        self.stabilized_regions = (stabilized >> np.arange(echoes.NUM_REGIONS)) & 1 == 1
+        return pos + struct.calcsize(DELTA_HEADER)
+
+    def apply_delta(self, payload):
+        # Returns whether any doors changed, so renderers can redraw the map
+        pos = self.read_header(payload, 0)
+        changed_doors = False
+        for layer, dtype in ((self.doors, np.uint8), (self.entities, np.uint16)):
+            count = struct.unpack_from('<I', payload, pos)[0]
+            pos += 4
+            cells = np.frombuffer(payload, dtype=np.uint32, count=count, offset=pos)
+            pos += 4 * count
+            values = np.frombuffer(payload, dtype=dtype, count=count, offset=pos)
+            pos += values.nbytes
+            layer.ravel()[cells] = values
+            if layer is self.doors:
+                changed_doors = count > 0
+        sections = payload[pos]
+        pos += 1
+        for section in (SECTION_MESSAGE, SECTION_INVENTORY, SECTION_ITEMS):
+            if not sections & section:
+                continue
+            length = struct.unpack_from('<H', payload, pos)[0]
+            value = json.loads(payload[pos + 2:pos + 2 + length])
+            pos += 2 + length
+            if section == SECTION_MESSAGE:
+                self.message = value
+            elif section == SECTION_INVENTORY:
+                self.player.inventory = RemoteInventory(value)
+            else:
+                self.set_items(value)
+        return changed_doors
+
+class GameServer:
+    def __init__(self, tick_rate=echoes.TICK_RATE, size=echoes.GRID_SIZE):
+        self.tick_rate = tick_rate
+        self.size = size
+        self.sessions = {}
+        self.next_session = 1
+        self.tick_times = deque(maxlen=STATS_TICKS)
+        self.ticks = 0
+        self.overruns = 0
+
+    async def join(self, request, role):
+        session_id = request.get('session')
+        if session_id is not None:
+            if not is_int(session_id) or session_id not in self.sessions:
+                raise ValueError(f"No session {session_id}")
+            return self.sessions[session_id]
+        # Nobody could steer a session a spectator started
+        if role == 'spectator':
+            raise ValueError("Spectators must name an existing session")
+        seed, size = request.get('seed'), request.get('size', self.size)
+        if seed is not None and (not is_int(seed) or not 0 <= seed < 2 ** 64):
+            raise ValueError("seed must be an integer from 0 to 2**64 - 1")
+        if not is_int(size) or not MIN_SESSION_SIZE <= size <= MAX_SESSION_SIZE:
+            raise ValueError(f"size must be an integer from {MIN_SESSION_SIZE} to {MAX_SESSION_SIZE}")
+        session_id = self.next_session
+        self.next_session += 1
+        # Generating a house can take a while; keep the other sessions ticking meanwhile
+        loop = asyncio.get_running_loop()
+        session = self.sessions[session_id] = await loop.run_in_executor(None, Session, session_id, seed, size)
+        return session
+
+    def stats(self):
+        times = np.array(self.tick_times) * 1000 if self.tick_times else np.zeros(1)
+        return {
+            'sessions': len(self.sessions),
+            'clients': sum(len(session.clients) for session in self.sessions.values()),
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'tick_budget_ms': 1000 / self.tick_rate,
+            'tick_p50_ms': float(np.percentile(times, 50)),
+            'tick_p99_ms': float(np.percentile(times, 99)),
+            'tick_max_ms': float(times.max())
+        }
+
+    async def handle_client(self, reader, writer):
+        session = None
+        try:
+            kind, payload = await read_frame(reader)
+            if kind != MSG_JOIN:
+                raise ConnectionError("Expected JOIN")
+            try:
+                request = json.loads(payload)
+                if not isinstance(request, dict):
+                    raise ValueError("JOIN expects a JSON object")
+                role = request.get('role', 'player')
+                if role not in ROLES:
+                    raise ValueError(f"Unknown role {role!r}")
+                # Monitors only query stats and do not belong to a session
+                if role != 'monitor':
+                    session = await self.join(request, role)
+            except ValueError as e:
+                writer.write(encode_frame(MSG_ERROR, str(e).encode('utf-8')))
+                return
+            if session is not None:
+                writer.write(encode_frame(MSG_KEYFRAME, session.keyframe()))
+                session.clients.add(writer)
+            player = role == 'player'
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == MSG_INPUT and player and payload and payload[0] < len(echoes.ACTIONS):
+                    session.inputs.append(echoes.ACTIONS[payload[0]])
+                elif kind == MSG_STATS:
+                    writer.write(encode_frame(MSG_STATS_REPLY, encode_json(self.stats())))
+                    if payload and payload[0]:
+                        self.tick_times.clear()
+                        self.overruns = 0
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                session.clients.discard(writer)
+                if not session.clients:
+                    self.sessions.pop(session.session_id, None)
+            writer.close()
+
+    def broadcast(self, session, frame):
+        for writer in list(session.clients):
+            # A client that cannot keep up is dropped rather than stalling the tick
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                session.clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+    async def run_ticks(self):
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            # CPU time, so the stats measure simulation cost even when the
+            # process shares its core with clients or bots
+            start = time.thread_time()
+            for session in list(self.sessions.values()):
+                if session.finished:
+                    continue
+                self.broadcast(session, encode_frame(MSG_DELTA, session.step()))
+            self.tick_times.append(time.thread_time() - start)
+            self.ticks += 1
+            next_tick += period
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Behind schedule: count it and start over instead of bursting
+                self.overruns += 1
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT, unix=None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix)
+            address = unix
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            address = '{}:{}'.format(*server.sockets[0].getsockname()[:2])
+        print(f"Listening on {address}", flush=True)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run_ticks())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session server for Echoes of the Forgotten")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help="0 picks a free port")
+    parser.add_argument('--unix', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--size', type=int, default=echoes.GRID_SIZE, help="default house size for new sessions")
+    parser.add_argument('--tick-rate', type=int, default=echoes.TICK_RATE)
+    args = parser.parse_args(argv)
+    if not MIN_SESSION_SIZE <= args.size <= MAX_SESSION_SIZE:
+        parser.error(f"--size must be from {MIN_SESSION_SIZE} to {MAX_SESSION_SIZE}")
+    try:
+        asyncio.run(GameServer(args.tick_rate, args.size).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())